@@ -1,8 +1,8 @@
-import concurrent.futures
+import startupBudget  # first, its import time stands in for the launch time
 import logging
+import queue
 import sys
 import threading
-import time
 import tkinter as tk
 import tkinter.font as font
 import tkinter.messagebox
@@ -10,42 +10,37 @@ from enum import Enum, auto
 from tkinter import scrolledtext
 from tkinter.constants import RAISED, SUNKEN
 from typing import Dict, List
-from datetime import datetime
 import ctypes
-import csv
-import numpy as np
-import serial
-import serial.tools.list_ports
-import zope.event
 import configClass
-import pyoto.otoProtocol.otoCommands as pyoto
-import pyoto.otoProtocol.otoMessageDefs as otoMessageDefs
-import random
-import pathlib
+import decayEngine
+import decayTest
+import lazyImport
+import otoSimulator
+import resultsStore
+import stateStore
+portRegistry = lazyImport.lazyModule("portRegistry")
+stationWorkers = lazyImport.lazyModule("stationWorkers")
 
 CONFIG_YAML_PATH = "config.yml"
 # -------- Other Settings --------
-# USB VID and PID of OtO flasher board
-VALID_VID = 0x10C4
-VALID_PID = 0xEA60
-# Max number of workers
+# Test settings (timing, connection mode, limits, outputs) are in decayEngine.py
+# Number of serial I/O threads shared by the stations, every station runs at once as an asyncio task and only holds a thread during a blocking serial call
 WORKERS = 20
+# Time in milliseconds between writes of queued log records to the card logs
+LOG_PUMP_INTERVAL = 50
+# Time in milliseconds between repaints of the cards whose status changed
+FRAME_INTERVAL = 100
+# Setting to true makes the button start and stop continuous testing: every station tests each newly
+# seated unit on its own, detected by a MAC change or reconnect, instead of the rack testing as one batch
+CONTINUOUS_FLAG = False
+# Number of worker processes the stations are split across, see stationWorkers.py, 0 runs every station in the GUI process
+WORKER_PROCESSES = 0
 # lock = threading.Lock()
 globalLoggingLevel = logging.INFO
 # Set up logging
 logging.basicConfig(level=globalLoggingLevel, format="%(message)s")
 mainLogger = logging.getLogger(__name__)
-
-OUTPUTMIN = 0.1 * (2**24)
-ADCtokPa = 206.8427 / (0.8 * (2**24)) # 206.8427 kPa = 30 psi
-TIMEINTERVAL = 60  # time in seconds to wait between samples
-TOTALTIME = 6 * 60 * TIMEINTERVAL  # time in seconds to collect data over
-DYNAMIC_FLAG = True #Setting to false will block all default movement commands
-UART_FLAG = True #Setting to false will use BLE to connect to below target unit instead
-TARGET_UNIT = "oto1234567" #Only used in BLE mode (when UART_FLAG = False)
-
-def tokPa(ADC):
-    return (ADC - OUTPUTMIN) * ADCtokPa
+startupBudget.mark("imports")
 
 class ButtonState:
     DISABLED = "disabled"
@@ -76,43 +71,53 @@ class EventType(Enum):
     ENABLE_PACK = auto()
 
 class SerialBoardCard(tk.Frame):
-    """Com Port Card Gui and Functional Class
+    """Com Port Card Gui Class, shows the status and log of one decayEngine.DecayStation
     One instance of this class is created for every flasher board with a serial"""
     IDLE_COLOR = "#dddddd"
     BUSY_COLOR = "#e9c7ff"
     OK_COLOR = "#40ff40"
     ERROR_COLOR = "#ff145b"
 
-    class PortStatus(Enum):
-        IDLE = auto()
-        CONNECTING = auto()
-        CHECK_PRESSURE = auto()
-        CONNECTED = auto()
-        SUCCESS = auto()
-        FAIL = auto()
-        FAIL_PRESSURE = auto()
-        CONNECT_FLASHER = auto()
-        WAITING = auto()
+    PortStatus = decayEngine.StationStatus
 
     class TextHandler(logging.Handler):
         # This class allows you to log to a Tkinter Text or ScrolledText widget
+        # emit only queues the record, so it is safe from any thread. pump, called
+        # on the Tk thread, writes the queued records to the widget in one batch.
         MAX_LINES = 100
+        MAX_BATCH = 500
 
         def __init__(self, scrolledTextWidget: scrolledtext.ScrolledText):
             logging.Handler.__init__(self)
             # Store a reference to the scrolledText it will log to
             self.scrolledTextWidget = scrolledTextWidget
+            self.queue = queue.SimpleQueue()
 
         def limit_lines(self):
-            # while the total number of lines is greater than max lines
-            while float(self.scrolledTextWidget.index("end-1c")) > self.MAX_LINES:
-                # remove the first line
-                self.scrolledTextWidget.delete("1.0", "2.0")
+            # remove every line over max lines with one ranged delete
+            excess = int(self.scrolledTextWidget.index("end-1c").split(".")[0]) - self.MAX_LINES
+            if excess > 0:
+                self.scrolledTextWidget.delete("1.0", f"{excess + 1}.0")
 
         def emit(self, record: logging.LogRecord):
-            msg = self.format(record)
+            try:
+                self.queue.put((self.format(record), record.levelno))
+            except Exception:
+                self.handleError(record)
+
+        def pump(self):
+            """Writes up to MAX_BATCH queued records to the widget, must run on the Tk thread"""
+            chunks = []
+            for _ in range(self.MAX_BATCH):
+                try:
+                    msg, levelno = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                chunks.extend((msg + "\n", levelno))
+            if not chunks:
+                return
             self.scrolledTextWidget.configure(state="normal")
-            self.scrolledTextWidget.insert(tk.END, msg + "\n", record.levelno)
+            self.scrolledTextWidget.insert(tk.END, *chunks)
             self.limit_lines()
             self.scrolledTextWidget.configure(state="disabled")
             # Autoscroll to the bottom
@@ -124,6 +129,9 @@ class SerialBoardCard(tk.Frame):
         flasherSerial: str,
         text: str,
         config_object: configClass.OtoFlasherConfigObject,
+        state_store: stateStore.StationStateStore,
+        results_store: resultsStore.ResultsStore = None,
+        local_station: bool = True,
     ):
 
         # ---- Init Self Widget ----
@@ -141,6 +149,10 @@ class SerialBoardCard(tk.Frame):
         self.labelStatus = tk.Label(self, font=fontComPortStatus)
         self.labelStatus.pack(side=tk.TOP, pady=4, anchor=tk.CENTER, expand=False, fill="both")
 
+        # ---- Init Sample Label Widget, pressure and fit rate of the last sample ----
+        self.labelSample = tk.Label(self, font=fontComPortTitle)
+        self.labelSample.pack(side=tk.TOP, pady=2, anchor=tk.CENTER, expand=False, fill="both")
+
         # Disable pack propagate here because ScrolledText seems to mess with card size
         self.pack_propagate(False)
         infoBoxFont = font.Font(family = "Microsoft YaHei UI", size = 8)
@@ -150,8 +162,9 @@ class SerialBoardCard(tk.Frame):
         while len(self.logger.handlers):
             self.logger.removeHandler(self.logger.handlers[0])
 
-        # Add handler to direct logs to infoBox
-        self.logger.addHandler(SerialBoardCard.TextHandler(self.infoBox))
+        # Add handler to direct logs to infoBox, Application pumps it on the Tk thread
+        self.logHandler = SerialBoardCard.TextHandler(self.infoBox)
+        self.logger.addHandler(self.logHandler)
         self.infoBox.pack(side = tk.BOTTOM, padx = 2, pady = 2, expand = True, fill = tk.BOTH)
 
         # Define styling for logging levels
@@ -163,18 +176,18 @@ class SerialBoardCard(tk.Frame):
         self.infoBox.tag_config(logging.CRITICAL, foreground="red", underline = 1)
 
         # ---- Set other self properties ----
-        self.port = None
-        self.unitSerial = None
         self.flasherSerial = flasherSerial
-        self.status = SerialBoardCard.PortStatus.IDLE
-        self.MACAddress = None
         self.config_object = config_object
-        self.Pressure_Failed = False
-        self.PressureAve: float = 0
-        self.PressureSTD: float = 0
-        self.Pressures = []
-        self.STDs = []
-        self.bomNumber: str = None
+        self.stateStore = state_store
+        self.status = SerialBoardCard.PortStatus.IDLE
+        # without a local station the card shows a station run by a stationWorkers worker process
+        self.station = decayEngine.DecayStation(
+            flasherSerial,
+            label=str(text),
+            results_store=results_store,
+            on_status=self.onStationStatus,
+            on_sample=self.onStationSample,
+        ) if local_station else None
 
     def __str__(self):
         return self.labelPortName["text"]
@@ -201,131 +214,41 @@ class SerialBoardCard(tk.Frame):
             self._setStatusSuccess()
         elif new_status == SerialBoardCard.PortStatus.FAIL_PRESSURE:
             self._setStatusFailPressure()
+        elif new_status == SerialBoardCard.PortStatus.FAIL_LEAK:
+            self._setStatusFailLeak()
         elif new_status == SerialBoardCard.PortStatus.CONNECT_FLASHER:
             self._setStatusConnectFlasher()
         elif new_status == SerialBoardCard.PortStatus.WAITING:
             self._setStatusWaiting()
+        elif new_status == SerialBoardCard.PortStatus.LOAD_UNIT:
+            self._setStatusLoadUnit()
         else:
             self.logger.warning(f"Invalid status: {new_status}")
+        self.labelSample["bg"] = self["background"]
 
     @property
     def isBusy(self):
         """Check if current status of port is busy"""
-        busyStates = [
-            SerialBoardCard.PortStatus.CONNECTING,
-            SerialBoardCard.PortStatus.CONNECTED,
-            SerialBoardCard.PortStatus.SUCCESS,
-            SerialBoardCard.PortStatus.CHECK_PRESSURE,
-            SerialBoardCard.PortStatus.WAITING
-        ]
-
-        # True if current state is one of the busy states
-        if self.status in busyStates:
-            return True
-        return False
+        return self.status in decayEngine.BUSY_STATES
 
     @isBusy.setter
     def isBusy(self, new_busy):
         self.logger.warning(f"Cannot set isBusy to {new_busy}, Read-only Property")
 
+    def onStationStatus(self, station: decayEngine.DecayStation, new_status):
+        """Queues status changes of the station, Application repaints the card on the Tk thread"""
+        self.stateStore.update(self, new_status)
+
+    def onStationSample(self, station: decayEngine.DecayStation, sampleTime: float, pressure: float, rate: float):
+        """Queues the station's latest sample, Application shows it on the Tk thread"""
+        self.stateStore.updateSample(self, (pressure, rate))
+
+    def showSample(self, pressure: float, rate: float):
+        self.labelSample["text"] = f"{round(pressure, 2)} kPa\n{rate} kPa/hr"
+
     def ButtonCallback(self):
         """check pressure decay"""
-
-        self.Pressure_Failed = False
-
-        self.logger.info(f"Started Testing for {TOTALTIME/60} minutes, every {TIMEINTERVAL} seconds...")
-
-        # STEP 1 Find COM port if in UART Mode:
-        error = self.getSerialPortFromUSBSerial()
-        if error is not None:
-            self.logger.error(error)
-            self.status = SerialBoardCard.PortStatus.CONNECT_FLASHER
-            zope.event.notify(EventType.UPDATE_ALL)
-            return error
-
-        # STEP 2 Connect to OtO after making it reboot
-        error = self.OtOConnect()
-        if error is not None:
-            self.logger.error(error)
-            self.status = SerialBoardCard.PortStatus.FAIL
-            zope.event.notify(EventType.UPDATE_ALL)
-            return error
-
-        # STEP 3 Get pressure sensor version so we can set appropriate limits
-        error = self.getPressureSensorVersion()
-        if error is not None:
-            self.logger.error(error)
-            self.status = SerialBoardCard.PortStatus.FAIL
-            zope.event.notify(EventType.UPDATE_ALL)
-            return error
-
-        # Step 4 Pressure Check for x minutes
-        MACName = self.MACAddress.replace(":", "-")
-        self.Pressures.clear()
-        self.STDs.clear()
-        StartTime = time.time()
-        t0 = StartTime
-        t1 = StartTime + 1
-        Duration = 0
-        StartDate = str(datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
-        self.logger.info(f"{self.MACAddress}, {StartDate}")
-        FileName = MACName + " readings.csv"
-        if not pathlib.Path(FileName).exists():
-            Header = True
-        else:
-            Header = False
-        while Duration < TOTALTIME:
-            if t0 > t1:
-                error = self.PressureCheck(data_collection_time = 3.0)
-                logtime = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-                self.status = SerialBoardCard.PortStatus.WAITING
-                zope.event.notify(EventType.UPDATE_ALL)
-                if error is not None:
-                    self.logger.error(error)
-                    self.status = SerialBoardCard.PortStatus.FAIL_PRESSURE
-                    zope.event.notify(EventType.UPDATE_ALL)
-                    return error
-                self.Pressures.append(self.PressureAve)
-                self.STDs.append(self.PressureSTD)
-                if Duration > 0:
-                    AverageRate = round((self.Pressures[0] - self.PressureAve) / (Duration / 3600), 3)
-                    RateError = round((2.75 * (self.STDs[0] + self.PressureSTD)) / (Duration / 3600), 4)
-                with open(MACName + " readings.csv", "a", newline='') as csvfile:
-                    dataWriter = csv.writer(csvfile)
-                    if Header:
-                        row = ["Time Stamp", "Ave Pressure (kPa)", "Pressure STD (kPa)", "Average Rate (kPa/hr)", "Rate Error (±kPa/hr)"]
-                        dataWriter.writerow(row)
-                        Header = False
-                    row = [logtime, round(self.PressureAve, 4), round(self.PressureSTD * 2.75, 5), AverageRate, RateError]
-                    dataWriter.writerow(row)
-                    csvfile.close()
-                self.logger.info(f"{round(Duration/60, 1)} minutes: {round(self.PressureAve, 2)}±{round(self.PressureSTD * 2.75, 3)} kPa, {AverageRate}±{RateError} kPa/hr")
-                t1 = t0 + TIMEINTERVAL
-            else:
-                time.sleep(t1 - t0)
-            t0 = time.time()
-            Duration = t0 - StartTime
-        error = self.PressureCheck(data_collection_time = 3.0)
-        logtime = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        self.status = SerialBoardCard.PortStatus.WAITING
-        zope.event.notify(EventType.UPDATE_ALL)
-        if error is not None:
-            self.logger.error(error)
-            self.status = SerialBoardCard.PortStatus.FAIL_PRESSURE
-            zope.event.notify(EventType.UPDATE_ALL)
-            return error
-        self.Pressures.append(self.PressureAve)
-        self.STDs.append(self.PressureSTD)
-        AverageRate = round((self.Pressures[0] - self.PressureAve) / (TOTALTIME / 3600), 3)
-        RateError = round((2.75 * (self.STDs[0] + self.PressureSTD)) / (TOTALTIME / 3600), 4)
-        with open(FileName, "a", newline='') as csvfile:
-            dataWriter = csv.writer(csvfile)
-            row = [logtime, round(self.PressureAve, 4), round(self.PressureSTD * 2.75, 5), AverageRate, RateError]
-            dataWriter.writerow(row)
-            csvfile.close()
-        self.logger.info(f"{round(TOTALTIME/60, 1)} minutes: {round(self.PressureAve, 2)}±{round(self.PressureSTD * 2.75, 3)} kPa, {AverageRate}±{RateError} kPa/hr")
-        self.logger.info("Test complete.")
-        return None
+        return self.station.runTest()
 
     def _setStatusIdle(self):
         self.configure(background=self.IDLE_COLOR)
@@ -341,6 +264,13 @@ class SerialBoardCard(tk.Frame):
         self.labelStatus["text"] = "Waiting"
         self.labelStatus["bg"] = self.IDLE_COLOR
 
+    def _setStatusLoadUnit(self):
+        self.configure(background=self.IDLE_COLOR)
+        self._status = SerialBoardCard.PortStatus.LOAD_UNIT
+        self.labelPortName["bg"] = self.IDLE_COLOR
+        self.labelStatus["text"] = "Load Unit\n放置产品"
+        self.labelStatus["bg"] = self.IDLE_COLOR
+
     def _setStatusSuccess(self):
         self.configure(background=self.OK_COLOR)
         self._status = SerialBoardCard.PortStatus.SUCCESS
@@ -362,6 +292,13 @@ class SerialBoardCard(tk.Frame):
         self.labelStatus["text"] = "Failed Pressure Sensor\n压力传感器故障"
         self.labelStatus["bg"] = self.ERROR_COLOR
 
+    def _setStatusFailLeak(self):
+        self.configure(background=self.ERROR_COLOR)
+        self._status = SerialBoardCard.PortStatus.FAIL_LEAK
+        self.labelPortName["bg"] = self.ERROR_COLOR
+        self.labelStatus["text"] = "Failed Leak Rate\n泄漏率不合格"
+        self.labelStatus["bg"] = self.ERROR_COLOR
+
     def _setStatusConnecting(self):
         self._status = SerialBoardCard.PortStatus.CONNECTING
         self.labelStatus["text"] = "Connecting 连接"
@@ -376,6 +313,7 @@ class SerialBoardCard(tk.Frame):
     def _setStatusConnected(self):
         self._status = SerialBoardCard.PortStatus.CONNECTED
         self.labelStatus["text"] = "Connected 连接成功"
+        self.labelSample["text"] = ""
 
     def _setStatusConnectFlasher(self):
         self.configure(background=self.ERROR_COLOR)
@@ -384,119 +322,6 @@ class SerialBoardCard(tk.Frame):
         self.labelStatus["text"] = "CONNECT FLASHER\n连接USB通信测试板"
         self.labelStatus["bg"] = self.ERROR_COLOR
 
-    def getSerialPortFromUSBSerial(self):
-        """Match port with serial card by matching the serial numbers
-        Uses self.flasherSerial
-        Saves as string to self.port"""
-
-        self.port = None
-        if UART_FLAG:
-            allPorts = serial.tools.list_ports.comports()
-            for port in allPorts:
-                if port.serial_number == self.flasherSerial and port.vid == VALID_VID and port.pid == VALID_PID:
-                    self.port = port.name
-            if self.port is None:
-                return f"COM port with serial {self.flasherSerial}, vid {VALID_VID}, pid {VALID_PID} not found. Ensure flashing boards are connected to the computer\n确认USB通信测试板与计算机连接"
-        return None
-
-    def PressureCheck(self, data_collection_time: float):
-        self.status = SerialBoardCard.PortStatus.CHECK_PRESSURE
-        Sensor_Read_List: List[pyoto.otoMessageDefs.SensorReadMessage] = []
-        pressureReading: list = []
-        self.PressureAve = 0
-        self.PressureSTD = 0
-        if DYNAMIC_FLAG:
-            ValveSpeed = random.uniform(50,100)
-            if random.random() > 0.5:
-                ValveDirection = 1
-            else:
-                ValveDirection = -1
-            NozzleSpeed = random.uniform(20, 100)
-            if random.random() > 0.5:
-                NozzleDirection = 1
-            else:
-                NozzleDirection = -1
-            self.pyoto_instance.set_valve_duty(direction = ValveDirection, duty_cycle = ValveSpeed)
-            self.pyoto_instance.set_nozzle_duty(direction = NozzleDirection, duty_cycle = NozzleSpeed)
-            self.pyoto_instance.set_sensor_subscribe(subscribe_frequency=pyoto.SensorSubscribeFrequencyEnum.SENSOR_SUBSCRIBE_FREQUENCY_100Hz)
-            time.sleep(0.1)
-        else:
-            self.pyoto_instance.set_sensor_subscribe(subscribe_frequency=pyoto.SensorSubscribeFrequencyEnum.SENSOR_SUBSCRIBE_FREQUENCY_100Hz)
-            time.sleep(0.1)
-        self.pyoto_instance.clear_incoming_packet_log()
-        main_loop_start_time = time.time()
-        while time.time() - main_loop_start_time <= data_collection_time:
-            Sensor_Read_List.extend(self.pyoto_instance.read_all_sensor_packets(limit=None, consume=True))
-        self.pyoto_instance.set_sensor_subscribe(subscribe_frequency=pyoto.SensorSubscribeFrequencyEnum.SENSOR_SUBSCRIBE_FREQUENCY_OFF)
-        self.pyoto_instance.clear_incoming_packet_log()
-        self.pyoto_instance.set_valve_duty(direction = 0, duty_cycle = 0)
-        self.pyoto_instance.set_nozzle_duty(direction = 0, duty_cycle = 0)
-        if not Sensor_Read_List:
-            return "No pressure data was collected.\n未收集压力数值"
-        for message in Sensor_Read_List:
-            pressureReading.append(int(message.pressure_adc))
-        self.PressureAve = round(tokPa(np.mean(pressureReading)), 4)
-        self.PressureSTD = round(ADCtokPa * np.std(pressureReading), 5)
-        return None
-
-    def OtOConnect(self):
-        if UART_FLAG:
-            try:
-                self.pyoto_instance = pyoto.OtoInterface(connection_type=pyoto.ConnectionType.UART, logger=None)
-                # self.pyoto_instance.logger.setLevel(logging.INFO)
-                self.logger.info("Waiting for board to reboot...\n等待线路板重启")
-                self.pyoto_instance.start_connection(port=self.port, reset_on_connect=True)
-                self.status = SerialBoardCard.PortStatus.CONNECTED
-                self.MACAddress = self.pyoto_instance.get_mac_address().string
-                self.logger.info(f"Battery: {round(float(self.pyoto_instance.get_voltages().battery_voltage_v), 2)} V")
-                self.pyoto_instance.use_moving_average_filter(True)
-            except Exception as error:
-                self.logger.exception("Failed to connect to board\n连接线路板失败")
-                return f"Failed to connect to board on port {self.port}:\n连接线路板失败\n{repr(error)}"
-        else:
-            try:
-                self.pyoto_instance = pyoto.OtoInterface(connection_type=pyoto.ConnectionType.BLE, logger=None)
-                # self.pyoto_instance.logger.setLevel(logging.INFO)
-                self.logger.info("Waiting for board to reboot...\n等待线路板重启")
-                self.pyoto_instance.start_connection(device_id=TARGET_UNIT, reset_on_connect=True)
-                self.status = SerialBoardCard.PortStatus.CONNECTED
-                self.MACAddress = self.pyoto_instance.get_mac_address().string
-                self.logger.info(f"Battery: {round(float(self.pyoto_instance.get_voltages().battery_voltage_v), 2)} V")
-                self.pyoto_instance.use_moving_average_filter(True)
-            except pyoto.otoBle.OtoNotFoundError as e:
-                print(f"\033[31mOtO {TARGET_UNIT} BLE not running! Try flicking switch and ensure you have the right unit number\033[0m")
-                return
-            except Exception as error:
-                self.logger.exception("Unhandled error! Failed to connect to board\n连接线路板失败")
-                return f"Failed to connect to board on port {self.port}:\n连接线路板失败\n{repr(error)}"
-            
-
-
-
-    def getPressureSensorVersion(self):
-        # assumes pyoto connection is open
-        try:
-            return_message = self.pyoto_instance.get_pressure_sensor_version()
-        except Exception as error:
-            self.logger.exception("Failed to get pressure sensor address\n无法获得压力传感器地址")
-            return f"Failed to get pressure sensor address on port {self.port}:\n无法获得压力传感器地址\n{repr(error)}"
-        returned_pressure_sensor_version = return_message.pressure_sensor_version  # should be an int
-        # see PressureSensorVersionEnum in otoMessageDefs for breakdown
-        if returned_pressure_sensor_version == otoMessageDefs.PressureSensorVersionEnum.PRESSURE_SENSOR_UNINITIALIZED.value:
-            return "Uninitialized pressure sensor\n压力传感器未能启动"
-        elif returned_pressure_sensor_version == otoMessageDefs.PressureSensorVersionEnum.TPBD_15_PSI_GAUGE.value or returned_pressure_sensor_version == otoMessageDefs.PressureSensorVersionEnum.MPRL_15_PSI_GAUGE.value:
-            return "This is an old design board and cannot be tested on this station."
-        elif returned_pressure_sensor_version == otoMessageDefs.PressureSensorVersionEnum.MPRL_30_PSI_GAUGE.value:
-            # self.logger.info("30 psi pressure sensor detected\n检测到0.21MPa压力传感器")
-            self.GaugeRange = 206.8427  # 206.8427 kPa = 30 psi
-            self.max_acceptable_STD: float = 206.9  # Jan 2023 ±4σ
-            self.min_acceptable_STD: float = 66.5  # Jan 2023 ±4σ
-            self.max_acceptable_ADC: float = 1764145  # Jan 2023 ±4σ 1764145
-            self.min_acceptable_ADC: float = 1630925  # Jan 2023 ±4σ 1630925
-            return None
-        else:
-            return "Unknown pressure sensor detected\n检查到未知压力传感器"
-
 class AllButton(tk.Button):
     FONT_FAMILY = "Microsoft YaHei UI"
     FONT_SIZE = 22
@@ -505,13 +330,15 @@ class AllButton(tk.Button):
     NORMAL_COLOR_FG = "#000000"
     DISABLED_COLOR_BG = "#00dfed"
     DISABLED_COLOR_FG = "#ffffff"
+    TEXT = "Start Decay Test"
+    STOP_TEXT = "Stop Decay Test"
 
     def __init__(self, master=None, command=None):
         tk.Button.__init__(
             self,
             master,
             font=font.Font(family=self.FONT_FAMILY, size=self.FONT_SIZE, weight=self.FONT_WEIGHT),
-            text = "Start Decay Test",
+            text = self.TEXT,
             command=command,
         )
         self.enable()
@@ -548,20 +375,61 @@ class Application(tk.Frame):
         # Load config from yaml
         self.config_object = configClass.OtoFlasherConfigObject()
         self.read_validate_yaml_config()
+        startupBudget.mark("config")
+
+        # Open results database shared by all cards, worker processes open their own
+        self.resultsStore = None
+        if decayEngine.RESULTS_DB_PATH and not WORKER_PROCESSES:
+            self.resultsStore = resultsStore.ResultsStore(decayEngine.RESULTS_DB_PATH)
+        self.stateStore = stateStore.StationStateStore(decayEngine.BUSY_STATES)
+        self.testAllDone = threading.Event() # set from the test threads, cleared on the Tk thread
+        self.continuousStop: threading.Event = None
+        self.supervisor: stationWorkers.StationSupervisor = None
 
         # Setup gui widgets
         self.createWidgets()
         self.createPortCards()
+        startupBudget.mark("cards")
+        if WORKER_PROCESSES:
+            self.startWorkers()
 
-        zope.event.subscribers.append(self.updateAllButton)
+        self.pumpLogs()
+        self.repaintCards()
 
-    def updateAllButton(self, event):
+    def updateAllButton(self):
         """Update the status of the all button"""
-        if event == EventType.UPDATE_ALL:
-            if any([True for x in self.portCardList if x.isBusy]):
-                self.ButtonAll.disable()
-            else:
-                self.ButtonAll.enable()
+        if self.continuousStop is not None:
+            return  # the button stops continuous testing
+        if self.stateStore.busyCount:
+            self.ButtonAll.disable()
+        else:
+            self.ButtonAll.enable()
+
+    def repaintCards(self):
+        """Repaints the cards whose status changed or that took a sample since the last frame, reschedules itself every FRAME_INTERVAL"""
+        # read before draining, TestAll sets it after its last status change
+        testAllDone = self.testAllDone.is_set()
+        if testAllDone:
+            self.testAllDone.clear()
+        changes = self.stateStore.drain()
+        for portCard, status in changes.items():
+            portCard.status = status
+        for portCard, sample in self.stateStore.drainSamples().items():
+            portCard.showSample(*sample)
+        if changes:
+            self.updateAllButton()
+        if testAllDone:
+            if self.continuousStop is not None:
+                self.continuousStop = None
+                self.ButtonAll["text"] = AllButton.TEXT
+            self.ButtonAll.enable()
+        self.after(FRAME_INTERVAL, self.repaintCards)
+
+    def pumpLogs(self):
+        """Writes the queued log records of every card, reschedules itself every LOG_PUMP_INTERVAL"""
+        for portCard in self.portCardList:
+            portCard.logHandler.pump()
+        self.after(LOG_PUMP_INTERVAL, self.pumpLogs)
 
     def disablePack(self, event):
         """Disable pack propogate for the portGuiWindow"""
@@ -592,6 +460,9 @@ class Application(tk.Frame):
         self.versionBox.grid(row=6, column=0, sticky="ns", padx=1, pady=1)
 
     def read_validate_yaml_config(self):
+        if decayEngine.SIM_FLAG:
+            self.config_object.flasher_list = otoSimulator.simulatedFlasherList(decayEngine.SIM_STATIONS)
+            return
         try:
             self.config_object.from_yaml_file()
 
@@ -619,7 +490,10 @@ class Application(tk.Frame):
                         self.guiWindow,
                         flasherSerial=serialItem,
                         text=str(index + 1),
-                        config_object=self.config_object
+                        config_object=self.config_object,
+                        state_store=self.stateStore,
+                        results_store=self.resultsStore,
+                        local_station=not WORKER_PROCESSES,
                     )
                 )
                 root.minsize(width=len(self.portCardList)*105, height=450)
@@ -630,47 +504,83 @@ class Application(tk.Frame):
             )
             on_closing()
 
-    @threaded
+    def startWorkers(self):
+        """Starts the worker processes that run the stations of the cards"""
+        self.supervisor = stationWorkers.StationSupervisor(
+            [portCard.flasherSerial for portCard in self.portCardList],
+            [str(portCard) for portCard in self.portCardList],
+            processes=WORKER_PROCESSES,
+            io_workers=WORKERS,
+            on_status=lambda index, status: self.stateStore.update(self.portCardList[index], status),
+            on_log=lambda index, record: self.portCardList[index].logHandler.emit(record),
+            on_sample=lambda index, sampleTime, pressure, rate: self.stateStore.updateSample(
+                self.portCardList[index], (pressure, rate)
+            ),
+            on_finished=self.onWorkersFinished,
+        ).start()
+
+    def onWorkersFinished(self, results: list):
+        self.testAllDone.set()
+
     def TestAll(self):
-        """Test all connected COM Ports"""
-        self.ButtonAll.disable()
-        resultList = list()
-        futureList: List[concurrent.futures.Future] = list()
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="testing") as executor:
-            for portGui in self.portCardList:
-                futureList.append(executor.submit(portGui.ButtonCallback))
-                concurrent.futures.wait(futureList, timeout = 1, return_when = "ALL_COMPLETED")
-        resultList = [x.result() for x in futureList]
-        index = 0
-        portList = map(str, self.portCardList)
-        for port, result in zip(portList, resultList):
+        """Test all connected COM Ports, or start / stop continuous testing if CONTINUOUS_FLAG is set"""
+        if not CONTINUOUS_FLAG:
+            self.ButtonAll.disable()
+            if self.supervisor is not None:
+                self.supervisor.runAll()
+            else:
+                self.runAllTests()
+        elif self.continuousStop is None:
+            self.continuousStop = threading.Event()
+            self.ButtonAll["text"] = AllButton.STOP_TEXT
+            if self.supervisor is not None:
+                self.supervisor.runContinuous()
+            else:
+                self.runContinuousTests(self.continuousStop)
+        else:
+            # running tests finish first, the button comes back when they have
+            self.continuousStop.set()
+            if self.supervisor is not None:
+                self.supervisor.stopContinuous()
+            self.ButtonAll.disable()
+
+    @threaded
+    def runContinuousTests(self, stop: threading.Event):
+        orchestrator = decayTest.makeOrchestrator(io_workers=WORKERS)
+        orchestrator.runContinuous(
+            [portCard.station for portCard in self.portCardList], stop, poll_interval=decayEngine.UNIT_POLL_INTERVAL
+        )
+        self.testAllDone.set()
+
+    @threaded
+    def runAllTests(self):
+        orchestrator = decayTest.makeOrchestrator(io_workers=WORKERS)
+        resultList = orchestrator.run([portCard.station for portCard in self.portCardList])
+        for portCard, result in zip(self.portCardList, resultList):
             if result is None:
-                self.portCardList[index].status = SerialBoardCard.PortStatus.SUCCESS
-                zope.event.notify(EventType.UPDATE_ALL)
-            index += 1
-        self.ButtonAll.enable()
+                portCard.station.status = SerialBoardCard.PortStatus.SUCCESS
+        self.testAllDone.set()
 
     def getValidPorts(self, VID=None, PID=None):
         """Return a list of all ports matching given usb vid and pid"""
-        validPorts: List[str] = list()
-        allPorts = serial.tools.list_ports.comports()
-        for port in allPorts:
-            if (VID is None or port.vid == VID) and (PID is None or port.pid == PID):
-                validPorts.append(port.name)
-        return validPorts
+        return [port.name for port in portRegistry.sharedRegistry().ports(VID, PID)]
 
 def on_closing():
     sys.exit()
 
 if __name__ == "__main__":
-    ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    if sys.platform == "win32":
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
     root = tk.Tk()
     root.title("OtO Decay Test - 2024")
     root.protocol("WM_DELETE_WINDOW", on_closing)
     root.grid_rowconfigure(0, weight=1)
     root.grid_columnconfigure(0, weight=1)
     root.minsize(width=105, height=450)
-    root.state("zoomed")
+    if sys.platform == "win32":
+        root.state("zoomed")
+    else:
+        root.attributes("-zoomed", True)
     app = Application(master=root)
+    root.after_idle(startupBudget.reportReady, mainLogger, decayEngine.STARTUP_BUDGET)
     root.mainloop()
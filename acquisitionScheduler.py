@@ -0,0 +1,102 @@
+"""Scheduling of sample windows across stations
+
+Stations that start together would acquire their 3 second, 100 Hz sample
+windows at the same moment every TIMEINTERVAL, bursting traffic on shared
+USB hubs. The AcquisitionScheduler staggers them deterministically: the
+stations are split into groups of max_concurrent by their index, and each
+group gets its own slot_time long slot in the sample interval. A semaphore
+also caps the windows acquiring at once, for stations that drift or more
+groups than slots. The slots only apply to batch runs, where the stations
+start together; in continuous mode units start whenever they are seated and
+only the semaphore caps their windows.
+
+The lag between a window's due time and its start is kept per station,
+and observed as the "schedule_lag" stage when metrics are given."""
+
+import asyncio
+import contextlib
+import threading
+from typing import Dict
+
+import stageMetrics
+
+
+class LagStats:
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, lag: float):
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        self.last = lag
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class AcquisitionScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = 10,
+        slot_time: float = 4.5,
+        interval: float = 60.0,
+        metrics: stageMetrics.StageMetrics = None,
+    ) -> None:
+        """Args:       max_concurrent: max sample windows acquiring at once
+                    slot_time: seconds reserved per window, the window plus margin
+                    interval: seconds between samples of a station
+                    metrics: stage metrics to observe the scheduling lag in, None to skip"""
+        self.max_concurrent = max_concurrent
+        self.slot_time = slot_time
+        self.interval = interval
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._lag: Dict[str, LagStats] = dict()
+        self._semaphore: asyncio.Semaphore = None
+        self._loop: asyncio.AbstractEventLoop = None
+
+    def offset(self, index: int) -> float:
+        """Seconds to delay the samples of the station with index, by its group's slot"""
+        slots = max(1, int(self.interval // self.slot_time))
+        return ((index // self.max_concurrent) % slots) * self.slot_time
+
+    @contextlib.asynccontextmanager
+    async def window(self, station):
+        """Holds one of the max_concurrent window places while the station takes its sample"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # each TestOrchestrator run has its own event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        due = station.nextSampleTime
+        async with self._semaphore:
+            self.recordLag(stationKey(station), max(0.0, station.clock.time() - due))
+            yield
+
+    def recordLag(self, station: str, lag: float):
+        with self._lock:
+            stats = self._lag.get(station)
+            if stats is None:
+                stats = self._lag[station] = LagStats()
+            stats.add(lag)
+        if self.metrics is not None:
+            self.metrics.observe(station, "schedule_lag", lag)
+
+    def lagReport(self) -> dict:
+        """Returns {station: {"count", "mean", "max", "last"}} of the scheduling lag in seconds"""
+        with self._lock:
+            return {
+                station: {"count": stats.count, "mean": stats.mean, "max": stats.max, "last": stats.last}
+                for station, stats in self._lag.items()
+            }
+
+
+def stationKey(station) -> str:
+    return getattr(station, "flasherSerial", None) or str(station)
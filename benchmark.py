@@ -0,0 +1,344 @@
+"""Benchmarks of the acquisition, statistics, logging and orchestration paths
+
+Every case runs against simulated OtO devices on a discrete event clock, so
+it measures our own processing only, not sensor or sampling waits:
+    pressure_check  one PressureCheck sample window, 300 packets replayed from a capture
+    csv_write       one results row through CsvResultsWriter
+    text_handler    one TextHandler.emit and pump including limit_lines, needs a display
+    test_all        a full TestOrchestrator run of 1 to N stations
+    real_clock      one sample on 20 and on 200 stations with the real clock and 20 I/O threads, a run must not slow down
+                    with more stations than serial I/O threads
+    startup         a fresh process loading config.yml and creating its stations, cold and with the config snapshot
+
+Each case reports throughput, latency percentiles and peak traced memory.
+Memory is traced in a separate pass since tracing slows every allocation.
+Results are saved as JSON named after the git commit, compare two of them with
+    python benchmark.py --compare benchmark_results/old.json benchmark_results/new.json"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import configClass
+import decayEngine
+import otoSimulator
+import resultsWriter
+import sessionCapture
+import testOrchestrator
+import virtualClock
+
+RESULTS_DIR = "benchmark_results"
+PERCENTILES = (50, 90, 99)
+MEMORY_CALLS = 20  # calls per latency case traced for peak memory
+STATION_COUNTS = (1, 10, 100)
+SCALING_TEST_TIME = 30 * 60  # simulated test length in seconds of each test_all station
+REAL_CLOCK_COUNTS = (20, 200)  # station counts of the real_clock case, the first is the io_workers of every run
+STARTUP_RUNS = 5  # processes started per startup case
+STARTUP_STATIONS = 100  # flasher boards in the startup case's config.yml
+STARTUP_SCRIPT = (
+    "import startupBudget, sys, decayTest; "
+    "decayTest.makeStations(decayTest.loadFlasherSerials(sys.argv[1])); "
+    "print(startupBudget.elapsed())"
+)
+
+
+def gitCommit():
+    """Returns (short commit hash, True if the tree has uncommitted changes), ("unknown", False) outside git"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def summarize(latencies: list, items_per_call: int = 1, peak_memory: int = 0) -> dict:
+    """Throughput, latency percentiles in microseconds and peak memory of one case"""
+    latencies = np.asarray(latencies)
+    total = float(latencies.sum())
+    summary = {
+        "calls": len(latencies),
+        "throughput_per_s": items_per_call * len(latencies) / total if total > 0 else None,
+        "mean_us": float(latencies.mean() * 1e6),
+        "peak_memory_kib": peak_memory / 1024,
+    }
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}_us"] = float(np.percentile(latencies, percentile) * 1e6)
+    return summary
+
+
+def tracePeakMemory(fn, *args):
+    """Returns (result of fn(*args), peak traced memory in bytes)"""
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def timeCalls(fn, repeat: int) -> tuple:
+    """Calls fn repeat times, then MEMORY_CALLS more times with memory tracing
+    Returns:    (list of latencies in seconds, peak traced memory in bytes)"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    _, peak = tracePeakMemory(lambda: [fn() for _ in range(MEMORY_CALLS)])
+    return latencies, peak
+
+
+def simulatedStation(serial_number: str, interface_factory=None) -> decayEngine.DecayStation:
+    if interface_factory is None:
+        interface_factory = lambda clock: otoSimulator.SimulatedOtoInterface(profile=decayEngine.SIM_PROFILE, clock=clock)
+    return decayEngine.DecayStation(
+        serial_number, clock=virtualClock.DiscreteEventClock(), interface_factory=interface_factory
+    )
+
+
+def startedStation(serial_number: str, interface_factory=None) -> decayEngine.DecayStation:
+    station = simulatedStation(serial_number, interface_factory)
+    error = station.startTest()
+    if error is not None:
+        raise RuntimeError(error)
+    return station
+
+
+def benchmarkPressureCheck(repeat: int) -> dict:
+    """Windows are recorded from the simulator first, so the replay times our processing without the packet model"""
+    windows = repeat + MEMORY_CALLS
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.jsonl")
+        station = startedStation(
+            "BENCH0000",
+            lambda clock: sessionCapture.RecordingOtoInterface(
+                otoSimulator.SimulatedOtoInterface(profile=decayEngine.SIM_PROFILE, clock=clock), path
+            ),
+        )
+        for _ in range(windows):
+            station.runSteps(station.PressureCheck(data_collection_time=3.0))
+        station.closeSessionCapture()
+        station = startedStation("BENCH0000", lambda clock: sessionCapture.ReplayOtoInterface(path, clock=clock))
+        latencies, peak = timeCalls(lambda: station.runSteps(station.PressureCheck(data_collection_time=3.0)), repeat)
+    return summarize(latencies, items_per_call=3 * decayEngine.SENSOR_RATE_HZ, peak_memory=peak)
+
+
+def benchmarkCsvWrite(repeat: int) -> dict:
+    row = ["2024-01-01 00:00:00.000000", 50.1234, 0.01234, 0.051, 0.0123, 0.049, 0.0012, ""]
+    with tempfile.TemporaryDirectory() as directory:
+        with resultsWriter.CsvResultsWriter(
+            os.path.join(directory, "bench readings.csv"),
+            decayEngine.CSV_HEADER,
+            flush_interval=decayEngine.CSV_FLUSH_INTERVAL,
+            checkpoint_interval=decayEngine.CSV_CHECKPOINT_INTERVAL,
+        ) as writer:
+            latencies, peak = timeCalls(lambda: writer.writerow(row), repeat)
+    return summarize(latencies, peak_memory=peak)
+
+
+def benchmarkTextHandler(repeat: int) -> dict:
+    import tkinter as tk
+    from tkinter import scrolledtext
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        return {"skipped": f"no display: {error}"}
+    import DecayOverall
+
+    root.withdraw()
+    widget = scrolledtext.ScrolledText(root)
+    handler = DecayOverall.SerialBoardCard.TextHandler(widget)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    record = logging.LogRecord("bench", logging.INFO, __file__, 0, "10.0 minutes: 50.12±0.012 kPa, 0.05±0.01 kPa/hr", None, None)
+    try:
+        latencies, peak = timeCalls(lambda: (handler.emit(record), handler.pump()), repeat)
+    finally:
+        root.destroy()
+    return summarize(latencies, peak_memory=peak)
+
+
+def benchmarkTestAll(station_counts) -> dict:
+    """Runs TestOrchestrator over growing station counts, samples are pressure windows
+    Each count runs twice, timed and then traced for peak memory"""
+    totalTime = decayEngine.TOTALTIME
+    decayEngine.TOTALTIME = SCALING_TEST_TIME
+    results = {}
+
+    def runStations(count):
+        stations = [simulatedStation(f"BENCH{index:04d}") for index in range(count)]
+        return stations, testOrchestrator.TestOrchestrator().run(stations)
+
+    try:
+        for count in station_counts:
+            start = time.perf_counter()
+            stations, errors = runStations(count)
+            elapsed = time.perf_counter() - start
+            _, peak = tracePeakMemory(runStations, count)
+            samples = sum(len(station.Pressures) for station in stations)
+            results[str(count)] = {
+                "stations": count,
+                "failed": sum(error is not None for error in errors),
+                "seconds": elapsed,
+                "samples_per_s": samples / elapsed,
+                "peak_memory_kib": peak / 1024,
+            }
+    finally:
+        decayEngine.TOTALTIME = totalTime
+    return results
+
+
+def benchmarkRealClock(station_counts) -> dict:
+    """Runs one sample per station on the real clock, reboot, settle and window waits included
+    The run should take about as long for any station count, "slowdown" is the last count over the first"""
+    totalTime = decayEngine.TOTALTIME
+    decayEngine.TOTALTIME = 0  # the first sample completes the test
+    results = {}
+    try:
+        for count in station_counts:
+            stations = [
+                decayEngine.DecayStation(
+                    f"BENCH{index:04d}",
+                    clock=virtualClock.SystemClock(),
+                    interface_factory=lambda clock: otoSimulator.SimulatedOtoInterface(profile=decayEngine.SIM_PROFILE, clock=clock),
+                )
+                for index in range(count)
+            ]
+            start = time.perf_counter()
+            errors = testOrchestrator.TestOrchestrator(io_workers=station_counts[0]).run(stations)
+            results[str(count)] = {
+                "stations": count,
+                "failed": sum(error is not None for error in errors),
+                "seconds": time.perf_counter() - start,
+            }
+    finally:
+        decayEngine.TOTALTIME = totalTime
+    results["slowdown"] = results[str(station_counts[-1])]["seconds"] / results[str(station_counts[0])]["seconds"]
+    return results
+
+
+def benchmarkStartup() -> dict:
+    """Starts fresh processes that load a config.yml and create its stations, like a restart after a crash
+    cold runs parse the yaml, warm runs read the config snapshot the cold run left"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH")]))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        configPath = os.path.join(directory, "config.yml")
+        with open(configPath, "w") as file_handler:
+            file_handler.write("flasher_list:\n")
+            for index in range(STARTUP_STATIONS):
+                file_handler.write(f"  - {{vid: '0x10c4', pid: '0xea60', serial: 'BENCH{index:04d}'}}\n")
+        for case in ("cold", "warm"):
+            launches, ready = [], []
+            for _ in range(STARTUP_RUNS):
+                if case == "cold" and os.path.exists(configPath + configClass.SNAPSHOT_SUFFIX):
+                    os.remove(configPath + configClass.SNAPSHOT_SUFFIX)
+                start = time.perf_counter()
+                output = subprocess.run(
+                    [sys.executable, "-c", STARTUP_SCRIPT, configPath], capture_output=True, text=True, check=True, env=env
+                ).stdout
+                launches.append(time.perf_counter() - start)
+                ready.append(float(output.split()[-1]))
+            results[case] = {
+                "ready_s": float(np.median(ready)),
+                "process_s": float(np.median(launches)),
+                "budget_s": decayEngine.STARTUP_BUDGET,
+            }
+    return results
+
+
+def runAll(repeat: int, station_counts) -> dict:
+    # no result files, database or captures, only the processing is measured
+    decayEngine.CSV_OUTPUT_FLAG = False
+    decayEngine.RAW_ARCHIVE_FLAG = False
+    decayEngine.RECORD_DIR = None
+    decayEngine.METRICS_PATH = None
+    logging.disable(logging.INFO)
+    random.seed(0)
+    commit, dirty = gitCommit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": {
+            "pressure_check": benchmarkPressureCheck(repeat),
+            "csv_write": benchmarkCsvWrite(repeat * 10),
+            "text_handler": benchmarkTextHandler(repeat),
+            "test_all": benchmarkTestAll(station_counts),
+            "real_clock": benchmarkRealClock(REAL_CLOCK_COUNTS),
+            "startup": benchmarkStartup(),
+        },
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Flattens nested case results to {"case.metric": value}"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    """Prints every metric of two saved results side by side with the new / old ratio"""
+    with open(old_path) as file_handler:
+        old = json.load(file_handler)
+    with open(new_path) as file_handler:
+        new = json.load(file_handler)
+    print(f"{'metric':<40} {old['commit']:>14} {new['commit']:>14} {'ratio':>8}")
+    oldCases = flatten(old["cases"])
+    for metric, value in flatten(new["cases"]).items():
+        if metric not in oldCases:
+            continue
+        ratio = value / oldCases[metric] if oldCases[metric] else float("nan")
+        print(f"{metric:<40} {oldCases[metric]:>14.2f} {value:>14.2f} {ratio:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=200, help="calls per latency case")
+    parser.add_argument("--stations", type=int, nargs="+", default=list(STATION_COUNTS), help="station counts of the test_all case")
+    parser.add_argument("--output", help=f"results file, {RESULTS_DIR}/<commit>.json by default")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    results = runAll(args.repeat, args.stations)
+    path = args.output
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{results['commit']}{'-dirty' if results['dirty'] else ''}.json")
+    with open(path, "w") as file_handler:
+        json.dump(results, file_handler, indent=2)
+    print(json.dumps(results["cases"], indent=2))
+    print(f"Saved to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,5 @@
 import sys
 import threading
-import time
 import tkinter as tk
 import tkinter.constants
 import tkinter.messagebox
@@ -9,12 +8,11 @@ from pprint import pprint
 from tkinter import ttk
 from typing import List
 
-import serial
-import serial.tools.list_ports
 import yaml
 import ctypes
 
 import configClass
+import portRegistry
 
 # -------- Basic Settings --------
 
@@ -30,7 +28,7 @@ VALID_PID = 0xEA60
 # Max number of workers
 WORKERS = 20
 
-# Port Listener Speed
+# Port Listener Speed, how often the listener checks for a stop request while waiting for port changes
 PORT_LISTENER_RATE_HZ = 4
 
 lock = threading.Lock()
@@ -91,6 +89,7 @@ class configureCOMPort(tk.Frame):
         super().__init__(master)
         self.master = master
         self.loadedSerialList = list()
+        self.loadedSerialSet = set()
         self.config_object = configClass.OtoFlasherConfigObject()
         self.createWidgets()
         self.setup_from_config_yaml()
@@ -196,33 +195,24 @@ class configureCOMPort(tk.Frame):
 
     def set_config_object_to_current_state(self):
         """Sets self.config_object to current GUI state"""
-        allPorts = serial.tools.list_ports.comports()
+        registry = portRegistry.sharedRegistry()
         flasher_list: List = list()
         for serialNumber in list(self.FlasherSerialTreeView.get_children()):
-            for port in allPorts:
-                if (
-                    (port.vid == VALID_VID)
-                    and (port.pid == VALID_PID)
-                    and (port.serial_number == serialNumber)
-                ):
-                    flasher_list.append(
-                        configClass.OtoFlasherObject(
-                            vid=str(hex(port.vid)),
-                            pid=str(hex(port.pid)),
-                            serial=str(port.serial_number),
-                        )
+            port = registry.find(VALID_VID, VALID_PID, serialNumber)
+            if port is not None:
+                flasher_list.append(
+                    configClass.OtoFlasherObject(
+                        vid=str(hex(port.vid)),
+                        pid=str(hex(port.pid)),
+                        serial=str(port.serial_number),
                     )
+                )
 
         self.config_object.flasher_list = flasher_list
 
     def getValidSerialNumbers(self, VID=None, PID=None):
         """Return a list of all port serial number matching given usb vid and pid"""
-        validPorts: List[str] = list()
-        allPorts = serial.tools.list_ports.comports()
-        for port in allPorts:
-            if (VID is None or port.vid == VID) and (PID is None or port.pid == PID):
-                validPorts.append(port.serial_number)
-        return validPorts
+        return portRegistry.sharedRegistry().serialNumbers(VID, PID)
 
     def moveItemUp(self, *args):
         """Callback Function for Up Button"""
@@ -235,7 +225,8 @@ class configureCOMPort(tk.Frame):
         max_index = len(self.FlasherSerialTreeView.get_children())
         new_index = min(max_index, max(0, selected_index - 1))
         self.FlasherSerialTreeView.move(selected_item, "", new_index)
-        self.updateIndexColumns()
+        # only the two swapped rows change index
+        self.updateIndexColumns(new_index, selected_index + 1)
 
     def moveItemDown(self, *args):
         """Callback Function for Down Button"""
@@ -247,63 +238,60 @@ class configureCOMPort(tk.Frame):
         max_index = len(self.FlasherSerialTreeView.get_children())
         new_index = min(max_index, max(0, selected_index + 1))
         self.FlasherSerialTreeView.move(selected_item, "", new_index)
-        self.updateIndexColumns()
+        # only the two swapped rows change index
+        self.updateIndexColumns(selected_index, new_index + 1)
 
     def clearItems(self):
         """Clears all items from the treeview"""
 
-        for item in self.FlasherSerialTreeView.get_children():
-            self.FlasherSerialTreeView.delete(item)
-
-        self.updateIndexColumns()
+        self.FlasherSerialTreeView.delete(*self.FlasherSerialTreeView.get_children())
 
     def portListener(self, VID, PID, *args):
-        """Listens to COM ports and updates portList as necessary"""
+        """Listens to COM ports and updates portList as necessary
+        Wakes up on port registry changes, or every 1 / PORT_LISTENER_RATE_HZ to check the stop flag"""
 
+        registry = portRegistry.sharedRegistry()
+        version = None
         while not self.stopListenerThread_flag:
 
             if self.listenToPorts:
 
                 newSerialList = self.getValidSerialNumbers(VID, PID)
+                newSerials = set(newSerialList)
+                shownSerials = set(self.FlasherSerialTreeView.get_children())
 
+                # keep the port order of new serials
                 addedSerials = [
                     serial_number
                     for serial_number in newSerialList
-                    if serial_number
-                    not in list(self.FlasherSerialTreeView.get_children())
-                ]
-
-                removedSerials = [
-                    serial_number
-                    for serial_number in list(self.FlasherSerialTreeView.get_children())
-                    if serial_number not in newSerialList
+                    if serial_number not in shownSerials
                 ]
+                removedSerials = shownSerials - newSerials
 
                 # Update list of com ports if ports were changed
                 if addedSerials or removedSerials:
                     with lock:
+                        if removedSerials:
+                            # Remove items from Treeview
+                            self.FlasherSerialTreeView.delete(*removedSerials)
+
                         for serial_number in addedSerials:
 
                             self.insertItem(serial_number)
 
-                        for serial_number in removedSerials:
-
-                            # Remove item from Treeview
-                            self.FlasherSerialTreeView.delete(serial_number)
+                        self.updateIndexColumns()
 
-                    self.updateIndexColumns()
-
-            time.sleep(1 / PORT_LISTENER_RATE_HZ)
+            version = registry.waitForChange(version, timeout = 1 / PORT_LISTENER_RATE_HZ)
 
     def insertItem(self, serial_number):
         """Inserts row into the treeview"""
 
-        if serial_number not in self.loadedSerialList:
+        if serial_number not in self.loadedSerialSet:
             tags = ["green_bg"]
         else:
             tags = []
 
-        # Insert new item into Treeview
+        # Insert new item into Treeview, callers update the index column once all rows are in
         self.FlasherSerialTreeView.insert(
             parent="",  # root level item
             index=tkinter.constants.END,  # adds to end of list
@@ -316,18 +304,17 @@ class configureCOMPort(tk.Frame):
             ),  # second column set to full serial number
             tags=tags,
         )
-        self.updateIndexColumns()
 
-    def updateIndexColumns(self):
-        """Applies the correct index number to each item in treeview"""
-        for item in self.FlasherSerialTreeView.get_children():
-            self.FlasherSerialTreeView.set(
-                item, column="index", value=self.FlasherSerialTreeView.index(item) + 1
-            )
+    def updateIndexColumns(self, start: int = 0, stop: int = None):
+        """Applies the correct index number to each item in treeview, or to the rows start to stop - 1"""
+        children = self.FlasherSerialTreeView.get_children()
+        stop = len(children) if stop is None else min(stop, len(children))
+        for index in range(start, stop):
+            self.FlasherSerialTreeView.set(children[index], column="index", value=index + 1)
 
     def removeTreeviewItem(self, serial_number):
 
-        if serial_number not in self.loadedSerialList:
+        if serial_number not in self.loadedSerialSet:
             tags = ["green_bg"]
         else:
             tags = []
@@ -361,10 +348,12 @@ class configureCOMPort(tk.Frame):
         # Set Flasher list
         if self.config_object.flasher_list:
             self.loadedSerialList = [x.serial for x in self.config_object.flasher_list]
+            self.loadedSerialSet = set(self.loadedSerialList)
         print(self.config_object.flasher_list)
         pprint(self.loadedSerialList)
         for item in self.loadedSerialList:
             self.insertItem(item)
+        self.updateIndexColumns()
 
     def write_current_state_to_yaml(self):
         """Writes self.config_object to yaml file"""
@@ -0,0 +1,41 @@
+"""Batched request / response commands
+
+A CommandBatch collects several commands for one device interface and
+runs them one after the other, collecting every reply instead of stopping
+at the first failure. Bring-up sends its commands as one batch so the
+sensor version is read together with the MAC address and voltages.
+
+The commands are not pipelined: pyoto's OtoInterface offers no way to keep
+several requests in flight on one link and match their replies, so a batch
+still costs one round trip per command.
+
+Replies come back in the order the commands were added. A command that
+raised gives back its exception, so the caller decides which failures
+matter."""
+
+from typing import List
+
+
+class CommandBatch:
+    def __init__(self, interface) -> None:
+        self.interface = interface
+        self._commands = list()
+
+    def add(self, name: str, *args, **kwargs) -> int:
+        """Queues interface.name(*args, **kwargs)
+        Returns:    index of its reply in the list returned by run"""
+        self._commands.append((getattr(self.interface, name), args, kwargs))
+        return len(self._commands) - 1
+
+    def run(self) -> List:
+        """Runs every queued command in order
+        Returns:    reply or raised exception of each command, in the order they were added"""
+        commands, self._commands = self._commands, list()
+        return [_outcome(command, *args, **kwargs) for command, args, kwargs in commands]
+
+
+def _outcome(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as error:
+        return error
@@ -1,7 +1,16 @@
+import hashlib
 import logging
+import marshal
 import os
 from typing import List
-import yaml
+
+import lazyImport
+
+# parsed only when the config snapshot is missing or out of date
+yaml = lazyImport.lazyModule("yaml")
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".snapshot"
 
 
 class OtoFlasherConfigObject:
@@ -24,9 +33,13 @@ class OtoFlasherConfigObject:
         Raises:     FileNotFoundError if file doesn't exist
                     Exception on yaml file read/parse error"""
 
-        with open(self.yaml_file_path, "r") as file_handler:
-            self.logger.info(f"Reading yaml from {os.path.realpath(file_handler.name)} ...")
-            yaml_object = yaml.load(file_handler, Loader=yaml.SafeLoader)
+        with open(self.yaml_file_path, "rb") as file_handler:
+            content = file_handler.read()
+        yaml_object = self.read_snapshot(content)
+        if yaml_object is None:
+            self.logger.info(f"Reading yaml from {os.path.realpath(self.yaml_file_path)} ...")
+            yaml_object = yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+            self.write_snapshot(content, yaml_object)
 
         self.flasher_list = list()
 
@@ -41,6 +54,39 @@ class OtoFlasherConfigObject:
             self.bom_number = yaml_object.get("bom_number")
             self.base_url = yaml_object.get("base_url")
 
+    def snapshot_key(self, content: bytes) -> tuple:
+        """Identifies the yaml file content a snapshot was made from, by a hash of the file bytes
+        The modification time and size alone miss an edit of the same size within one mtime tick"""
+        return (SNAPSHOT_VERSION, os.path.realpath(self.yaml_file_path), len(content), hashlib.blake2b(content).hexdigest())
+
+    def read_snapshot(self, content: bytes):
+        """Returns the parsed yaml of the snapshot next to the yaml file
+        None if there is none, it is unreadable or it was made from another version of the file"""
+        try:
+            with open(self.yaml_file_path + SNAPSHOT_SUFFIX, "rb") as file_handler:
+                key, yaml_object = marshal.load(file_handler)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if key != self.snapshot_key(content) or not _valid_yaml_object(yaml_object):
+            return None
+        self.logger.info(f"Reading config snapshot of {os.path.realpath(self.yaml_file_path)} ...")
+        return yaml_object
+
+    def write_snapshot(self, content: bytes, yaml_object):
+        """Saves the parsed yaml next to the yaml file, so later starts skip parsing until the file changes
+        A yaml_object with values marshal can't write or an unwritable folder leaves no snapshot"""
+        if not _valid_yaml_object(yaml_object):
+            return
+        path = self.yaml_file_path + SNAPSHOT_SUFFIX
+        try:
+            data = marshal.dumps((self.snapshot_key(content), yaml_object))
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file_handler:
+                file_handler.write(data)
+            os.replace(temp_path, path)
+        except (OSError, ValueError):
+            self.logger.debug(f"Config snapshot {path} not written", exc_info=True)
+
     def to_yaml_file(self):
         """Writes to yaml file
         If attribute is none, the field will not be written
@@ -101,3 +147,13 @@ class OtoFlasherObject:
         if isinstance(other, OtoFlasherObject):
             return self.pid == other.pid and self.vid == other.vid and self.serial == other.serial
         return False
+
+
+def _valid_yaml_object(yaml_object) -> bool:
+    """Returns True if yaml_object has the shape from_yaml_file reads: a dict with a list of flasher dicts"""
+    if not isinstance(yaml_object, dict):
+        return False
+    flasher_dict_list = yaml_object.get("flasher_list")
+    if flasher_dict_list is None:
+        return True
+    return isinstance(flasher_dict_list, list) and all(isinstance(flasher, dict) for flasher in flasher_dict_list)
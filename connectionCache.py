@@ -0,0 +1,54 @@
+"""Cache of open OtO connections, one per port
+
+A DecayStation hands its connection back here when a run ends, and takes it
+again at the start of the next run instead of rebooting the board. The
+station probes a taken connection before use and falls back to a fresh
+connection with reset_on_connect when the probe fails."""
+
+import logging
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._connections: Dict[str, object] = dict()
+
+    def take(self, port: str):
+        """Removes and returns the cached connection of port, None if there is none"""
+        with self._lock:
+            return self._connections.pop(port, None)
+
+    def put(self, port: str, connection):
+        """Caches connection for port, ending a connection already cached for it"""
+        with self._lock:
+            previous = self._connections.get(port)
+            self._connections[port] = connection
+        if previous is not None and previous is not connection:
+            closeConnection(previous)
+
+    def discard(self, port: str):
+        connection = self.take(port)
+        if connection is not None:
+            closeConnection(connection)
+
+    def closeAll(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            closeConnection(connection)
+
+    def __len__(self):
+        return len(self._connections)
+
+
+def closeConnection(connection):
+    """Ends connection, ignoring errors of a connection that is already dead"""
+    try:
+        connection.end_connection()
+    except Exception:
+        logger.debug("Failed to end cached connection", exc_info=True)
@@ -0,0 +1,667 @@
+"""Decay test engine
+
+DecayStation runs the pressure decay test of the unit on one flasher board:
+port lookup, connect, sensor version check, sampling and leak rate. It has
+no GUI, DecayOverall.SerialBoardCard shows a station's status and log, and
+testOrchestrator runs many stations at once."""
+
+import logging
+import os
+import random
+from enum import Enum, auto
+from typing import Callable
+
+import leakRate
+import commandBatch
+import connectionCache
+import lazyImport
+import otoSimulator
+import pressureStats
+import rawArchive
+import resultsStore
+import resultsWriter
+import sensorLimits
+import sessionCapture
+import stageMetrics
+import virtualClock
+import pyoto.otoProtocol.otoMessageDefs as otoMessageDefs
+# loaded on first use, simulated stations never need the pyoto interface and only UART_FLAG needs pyserial
+pyoto = lazyImport.lazyModule("pyoto.otoProtocol.otoCommands")
+portRegistry = lazyImport.lazyModule("portRegistry")
+
+# -------- Test Settings --------
+# USB VID and PID of OtO flasher board
+VALID_VID = 0x10C4
+VALID_PID = 0xEA60
+TIMEINTERVAL = 60  # time in seconds to wait between samples
+TOTALTIME = 6 * 60 * TIMEINTERVAL  # time in seconds to collect data over
+DYNAMIC_FLAG = True #Setting to false will block all default movement commands
+UART_FLAG = True #Setting to false will use BLE to connect to below target unit instead
+TARGET_UNIT = "oto1234567" #Only used in BLE mode (when UART_FLAG = False)
+SIM_FLAG = False #Setting to true replaces flasher boards with simulated OtO devices (see otoSimulator.py)
+SIM_STATIONS = 50 #Number of virtual stations created when SIM_FLAG = True, config.yml is not read
+SIM_PROFILE = otoSimulator.SimulationProfile() #Leak, noise, drift and fault injection settings of simulated units
+CLOCK_MODE = virtualClock.ClockMode.REAL #ACCELERATED or DISCRETE run the test loop faster than real time, only use with SIM_FLAG = True
+CLOCK_SPEEDUP = 60 #Speedup factor of the ACCELERATED clock mode
+SENSOR_RATE_HZ = 100 #Sensor subscription rate used by PressureCheck
+SENSOR_POLL_INTERVAL = 0.01 #Shortest wait in seconds between reads of the sensor packet log, one packet at 100 Hz
+SETTLE_TIMEOUT = 0.5 #Max time in seconds to wait for the sensor stream to start after subscribing
+LIMIT_CHECK_FLAG = True #Setting to false skips checking every sample window against the sensor version limits in sensorLimits.py
+EARLY_STOP_FLAG = False #Setting to true ends a test once the fitted leak rate interval lies entirely below or above MAX_LEAK_RATE
+MAX_LEAK_RATE = 0.5 #Leak rate acceptance limit in kPa/hr, only used when EARLY_STOP_FLAG = True
+MIN_TEST_TIME = 30 * 60 #time in seconds before a test may stop early
+ACQUISITION_MARGIN = 1.0 #Extra time in seconds a sample window may take to fill before it is cut short
+RESULTS_DB_PATH = "results.db" #SQLite database every run and sample is written to, set to None to disable
+CSV_OUTPUT_FLAG = True #Setting to false stops writing the per MAC readings.csv files
+RAW_ARCHIVE_FLAG = False #Setting to true keeps every raw pressure reading of a run in a compressed archive, see rawArchive.py
+RAW_ARCHIVE_DIR = "raw" #Folder the raw archives are written to, one file per run
+REUSE_CONNECTION_FLAG = True #Setting to false reboots the board at the start of every test instead of reusing a connection that still responds
+UNIT_POLL_INTERVAL = 2 #Time in seconds between checks for a newly seated unit in continuous mode
+RECORD_DIR = None #Folder to capture every device session to for replaySessions.py, e.g. "captures", None to disable
+CSV_FLUSH_INTERVAL = 10 #Max time in seconds a results row stays buffered before it is written to the file
+CSV_CHECKPOINT_INTERVAL = 600 #Max time in seconds between fsyncs of the results file, it is also fsynced when a run ends
+METRICS_PATH = "decay_stages.prom" #Prometheus text file with the time histograms of every test stage, see stageMetrics.py, None to disable
+METRICS_WRITE_INTERVAL = 15 #Min time in seconds between rewrites of the metrics file
+MAX_CONCURRENT_WINDOWS = 10 #Max stations acquiring a sample window at the same time when testing all, see acquisitionScheduler.py
+WINDOW_SLOT_TIME = 4.5 #Time in seconds reserved per sample window when staggering the stations, the window plus ACQUISITION_MARGIN and some slack
+STARTUP_BUDGET = 1.0 #Max time in seconds from launch until stations can connect, a longer startup is logged as a warning, see startupBudget.py
+CSV_HEADER = ["Time Stamp", "Ave Pressure (kPa)", "Pressure STD (kPa)", "Average Rate (kPa/hr)", "Rate Error (±kPa/hr)", "Fit Rate (kPa/hr)", "Fit Rate Error (±kPa/hr)", "Stop Reason"]
+
+class StationStatus(Enum):
+    IDLE = auto()
+    CONNECTING = auto()
+    CHECK_PRESSURE = auto()
+    CONNECTED = auto()
+    SUCCESS = auto()
+    FAIL = auto()
+    FAIL_PRESSURE = auto()
+    FAIL_LEAK = auto()
+    CONNECT_FLASHER = auto()
+    WAITING = auto()
+    LOAD_UNIT = auto()
+
+# Statuses in which a station counts as busy
+BUSY_STATES = frozenset((
+    StationStatus.CONNECTING,
+    StationStatus.CONNECTED,
+    StationStatus.SUCCESS,
+    StationStatus.CHECK_PRESSURE,
+    StationStatus.WAITING,
+))
+
+# Stage timings of every station in this process
+STAGE_METRICS = stageMetrics.StageMetrics()
+# Connections kept open between runs, by port
+CONNECTION_CACHE = connectionCache.ConnectionCache()
+
+class DecayStation:
+    """Decay test of the unit on one flasher board, identified by the board's USB serial"""
+
+    def __init__(
+        self,
+        flasherSerial: str,
+        label: str = None,
+        results_store: resultsStore.ResultsStore = None,
+        clock: virtualClock.SystemClock = None,
+        interface_factory: Callable = None,
+        on_status: Callable = None,
+        on_sample: Callable = None,
+    ):
+        """Args:       flasherSerial: USB serial of the flasher board
+                    label: name of the station, flasherSerial if None
+                    results_store: results database shared by all stations, None to disable
+                    clock: clock of the test loop, made from CLOCK_MODE if None
+                    interface_factory: called with the clock to create the device interface instead
+                        of picking one from SIM_FLAG / UART_FLAG, no port lookup is done when set
+                    on_status: called with (station, status) on every status change, from the test thread
+                    on_sample: called with (station, time, pressure in kPa, fit rate in kPa/hr) after every
+                        recorded sample, from the test thread"""
+        self.logger = logging.getLogger(flasherSerial)
+        self.label = label if label is not None else flasherSerial
+        self.port = None
+        self.unitSerial = None
+        self.flasherSerial = flasherSerial
+        self.onStatus = on_status
+        self.onSample = on_sample
+        self.interfaceFactory = interface_factory
+        self.status = StationStatus.IDLE
+        self.MACAddress = None
+        self.pyoto_instance = None
+        self.Pressure_Failed = False
+        self.PressureAve: float = 0
+        self.PressureSTD: float = 0
+        self.Pressures = []
+        self.STDs = []
+        self.leakFit = leakRate.LeakRateFit()
+        self.sensorLimits: sensorLimits.SensorLimits = None
+        self.pressureWindow = pressureStats.PressureWindow(capacity = 3 * SENSOR_RATE_HZ)
+        self.bomNumber: str = None
+        self.clock = clock if clock is not None else virtualClock.makeClock(CLOCK_MODE, CLOCK_SPEEDUP)
+        self.testComplete = False
+        self.stopReason: leakRate.StopReason = None
+        self.StartTime: float = 0
+        self.nextSampleTime: float = 0
+        self.sampleOffset: float = 0 # delay of the first sample set by the acquisition scheduler
+        self.FileName: str = None
+        self.resultsWriter: resultsWriter.CsvResultsWriter = None
+        self.resultsStore = results_store
+        self.runId: int = None
+        self.rawArchive: rawArchive.RawArchiveWriter = None
+        self.batteryVoltage: float = None
+        self.pressureSensorVersion: int = None
+        self.sensorVersionReply = None
+        self.lastTestedMAC: str = None
+        self.seatedMAC: str = None
+        self.fixtureEmpty = True
+        self.metrics = STAGE_METRICS
+
+    def __str__(self):
+        return self.label
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, new_status: StationStatus):
+        self._status = new_status
+        if self.onStatus is not None:
+            self.onStatus(self, new_status)
+
+    @property
+    def isBusy(self):
+        """Check if current status of port is busy"""
+        return self.status in BUSY_STATES
+
+    def runTest(self):
+        """check pressure decay
+        Returns:    None on success, error string otherwise"""
+
+        error = self.startTest()
+        while error is None and not self.testComplete:
+            self.clock.sleep(self.nextSampleDelay())
+            error = self.takeSample()
+        return error
+
+    def startTest(self):
+        """Finds the port, connects to the OtO and prepares a new decay run, blocking through its waits
+        Returns:    None on success, error string otherwise"""
+        return self.runSteps(self.startSteps())
+
+    def startSteps(self):
+        """Generator of one startTest, yields the seconds to wait for the board to reboot
+        testOrchestrator awaits the reboot like the sample waits, see sampleSteps
+        Returns:    None on success, error string otherwise"""
+
+        self.Pressure_Failed = False
+        self.testComplete = False
+        self.stopReason = None
+
+        self.logger.info(f"Started Testing for {TOTALTIME/60} minutes, every {TIMEINTERVAL} seconds...")
+
+        # STEP 1 Find COM port if in UART Mode:
+        with self.timeStage("port_lookup"):
+            error = self.getSerialPortFromUSBSerial()
+        if error is not None:
+            self.logger.error(error)
+            self.status = StationStatus.CONNECT_FLASHER
+            self.writeMetrics(force = True)
+            return error
+
+        # STEP 2 Connect to OtO after making it reboot, timed as the connect and bring_up stages
+        error = yield from self.OtOConnect()
+        if error is not None:
+            self.logger.error(error)
+            self.closeSessionCapture()
+            self.status = StationStatus.FAIL
+            self.writeMetrics(force = True)
+            return error
+
+        # STEP 3 Check the pressure sensor version read by bringUp so we can set appropriate limits
+        error = self.getPressureSensorVersion()
+        if error is not None:
+            self.logger.error(error)
+            self.releaseConnection()
+            self.status = StationStatus.FAIL
+            return error
+
+        # Step 4 Pressure Check for x minutes, first sample after 1 second plus the scheduler's stagger
+        self.Pressures.clear()
+        self.STDs.clear()
+        self.leakFit.reset()
+        self.StartTime = self.clock.time() + self.sampleOffset
+        self.nextSampleTime = self.StartTime + 1
+        StartDate = str(self.clock.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+        self.logger.info(f"{self.MACAddress}, {StartDate}")
+        MACName = self.MACAddress.replace(":", "-")
+        self.FileName = MACName + " readings.csv"
+        # a run left open by an unhandled error is not finished here, startRun marks it aborted
+        self.runId = None
+        self.closeResults()
+        if CSV_OUTPUT_FLAG:
+            self.resultsWriter = resultsWriter.CsvResultsWriter(
+                self.FileName, CSV_HEADER, flush_interval = CSV_FLUSH_INTERVAL, checkpoint_interval = CSV_CHECKPOINT_INTERVAL
+            )
+        if RAW_ARCHIVE_FLAG:
+            self.rawArchive = rawArchive.RawArchiveWriter(
+                os.path.join(RAW_ARCHIVE_DIR, f"{MACName} {int(self.StartTime)}.draw")
+            )
+        if self.resultsStore is not None:
+            self.runId = self.resultsStore.startRun(
+                self.flasherSerial, str(self), self.MACAddress, self.StartTime,
+                sensor_version = self.pressureSensorVersion, battery_voltage = self.batteryVoltage,
+            )
+        return None
+
+    def nextSampleDelay(self):
+        """Seconds until the next sample is due"""
+        return max(0.0, self.nextSampleTime - self.clock.time())
+
+    def takeSample(self):
+        """Takes and records one pressure sample, blocking through its waits
+        The first sample at or after TOTALTIME completes the test
+        Returns:    None on success, error string otherwise"""
+        return self.runSteps(self.sampleSteps())
+
+    def sampleSteps(self):
+        """Generator of one takeSample, yields the seconds to wait between its blocking serial calls
+        testOrchestrator runs the serial calls on its I/O pool and awaits the waits, so a station
+        spends its settle and sample window waits without holding a thread
+        Returns:    None on success, error string otherwise"""
+
+        error = yield from self.recordSample()
+        if error is not None or self.testComplete:
+            self.closeResults(error)
+            self.releaseConnection()
+        self.writeMetrics(force = error is not None or self.testComplete)
+        return error
+
+    def runSteps(self, steps):
+        """Runs a generator of steps such as sampleSteps, sleeping on the clock for every wait it yields
+        Returns:    value returned by the generator"""
+        while True:
+            try:
+                delay = next(steps)
+            except StopIteration as stop:
+                return stop.value
+            self.clock.sleep(delay)
+
+    def pollUnit(self):
+        """Asks the fixture for the MAC address of its unit, without rebooting it
+        The connection is left in CONNECTION_CACHE for the test to reuse
+        Returns:    MAC address, None if no unit answers"""
+        if self.getSerialPortFromUSBSerial() is not None:
+            return None
+        interface = CONNECTION_CACHE.take(self.port)
+        try:
+            if interface is None:
+                interface = self.newInterface()
+                interface.start_connection(port=self.port, reset_on_connect=False)
+            MACAddress = interface.get_mac_address().string
+        except Exception:
+            if interface is not None:
+                connectionCache.closeConnection(interface)
+            return None
+        if REUSE_CONNECTION_FLAG:
+            CONNECTION_CACHE.put(self.port, interface)
+        else:
+            connectionCache.closeConnection(interface)
+        return MACAddress
+
+    def checkForNewUnit(self):
+        """Continuous mode: checks if a unit to test is seated, i.e. its MAC differs from the last
+        tested unit or the fixture was empty since the last test
+        Returns:    True if a new unit is ready to test"""
+        MACAddress = self.pollUnit()
+        if MACAddress is None:
+            self.fixtureEmpty = True
+            if self.status != StationStatus.LOAD_UNIT:
+                self.status = StationStatus.LOAD_UNIT
+            return False
+        if MACAddress == self.lastTestedMAC and not self.fixtureEmpty:
+            return False
+        self.seatedMAC = MACAddress
+        self.logger.info(f"New unit {MACAddress}\n检测到新产品")
+        return True
+
+    def finishUnit(self, error: str = None):
+        """Continuous mode: releases the fixture after the test of its unit, the next unit is
+        detected by checkForNewUnit"""
+        self.lastTestedMAC = self.seatedMAC
+        self.fixtureEmpty = False
+        if error is None:
+            self.status = StationStatus.SUCCESS
+
+    def timeStage(self, stage: str):
+        """Context manager timing one stage of this station into STAGE_METRICS"""
+        return self.metrics.time(self.flasherSerial, stage)
+
+    def writeMetrics(self, force: bool = False):
+        if METRICS_PATH is None:
+            return
+        try:
+            if force:
+                self.metrics.write(METRICS_PATH)
+            else:
+                self.metrics.writeIfDue(METRICS_PATH, METRICS_WRITE_INTERVAL)
+        except OSError:
+            self.logger.exception("Failed to write stage metrics")
+
+    def closeResults(self, error: str = None):
+        """Closes the results file of the current run, fsyncing it, and marks the run finished in the results store"""
+        if self.resultsWriter is not None:
+            self.resultsWriter.close()
+            self.resultsWriter = None
+        if self.rawArchive is not None:
+            self.rawArchive.close()
+            self.rawArchive = None
+        if self.resultsStore is not None and self.runId is not None:
+            self.resultsStore.finishRun(
+                self.runId,
+                self.clock.time(),
+                stop_reason = self.stopReason.value if self.stopReason is not None else None,
+                fit_rate = self.leakFit.rate if self.leakFit.ready else None,
+                fit_rate_error = self.leakFit.rateError if self.leakFit.ready else None,
+                error = error,
+            )
+            self.runId = None
+
+    def closeSessionCapture(self):
+        """Closes the session capture of the current connection, if it is recorded"""
+        if isinstance(self.pyoto_instance, sessionCapture.RecordingOtoInterface):
+            self.pyoto_instance.close()
+
+    def recordSample(self):
+        sampleTime = self.clock.time()
+        Duration = sampleTime - self.StartTime
+        if Duration >= TOTALTIME:
+            Duration = TOTALTIME
+            self.testComplete = True
+            self.stopReason = leakRate.StopReason.FULL_DURATION
+        error = yield from self.PressureCheck(data_collection_time = 3.0)
+        logtime = self.clock.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        self.status = StationStatus.WAITING
+        if error is not None:
+            self.logger.error(error)
+            self.status = StationStatus.FAIL_PRESSURE
+            return error
+        self.Pressures.append(self.PressureAve)
+        self.STDs.append(self.PressureSTD)
+        self.leakFit.add(Duration / 3600, self.PressureAve, self.PressureSTD)
+        FitRate = round(self.leakFit.rate, 3)
+        FitRateError = round(self.leakFit.rateError, 4)
+        AverageRate = 0.0
+        RateError = 0.0
+        if Duration > 0:
+            AverageRate = round((self.Pressures[0] - self.PressureAve) / (Duration / 3600), 3)
+            RateError = round((2.75 * (self.STDs[0] + self.PressureSTD)) / (Duration / 3600), 4)
+        if EARLY_STOP_FLAG and not self.testComplete and Duration >= MIN_TEST_TIME:
+            self.stopReason = leakRate.sequentialDecision(self.leakFit, MAX_LEAK_RATE)
+            self.testComplete = self.stopReason is not None
+        StopText = self.stopReason.value if self.testComplete else ""
+        row = [logtime, round(self.PressureAve, 4), round(self.PressureSTD * 2.75, 5), AverageRate, RateError, FitRate, FitRateError, StopText]
+        if self.resultsWriter is not None:
+            with self.timeStage("csv_write"):
+                self.resultsWriter.writerow(row)
+        if self.resultsStore is not None:
+            with self.timeStage("db_write"):
+                self.resultsStore.addSample(
+                    self.runId, sampleTime, Duration, self.PressureAve, self.PressureSTD,
+                    average_rate = AverageRate, rate_error = RateError, fit_rate = FitRate, fit_rate_error = FitRateError,
+                )
+        self.logger.info(f"{round(Duration/60, 1)} minutes: {round(self.PressureAve, 2)}±{round(self.PressureSTD * 2.75, 3)} kPa, {AverageRate}±{RateError} kPa/hr, fit {FitRate}±{FitRateError} kPa/hr")
+        self.nextSampleTime = sampleTime + TIMEINTERVAL
+        if self.onSample is not None:
+            self.onSample(self, sampleTime, self.PressureAve, FitRate)
+        if self.testComplete:
+            self.logger.info(f"Test complete, {StopText}.")
+            if self.stopReason == leakRate.StopReason.FAIL_ABOVE_LIMIT:
+                error = f"Leak rate {FitRate}±{FitRateError} kPa/hr is above the {MAX_LEAK_RATE} kPa/hr limit\n泄漏率超出上限"
+                self.logger.error(error)
+                self.status = StationStatus.FAIL_LEAK
+                return error
+        return None
+
+    def getSerialPortFromUSBSerial(self):
+        """Match port with serial card by matching the serial numbers
+        Uses self.flasherSerial
+        Saves as string to self.port"""
+
+        self.port = None
+        if self.interfaceFactory is not None:
+            self.port = self.flasherSerial
+        elif SIM_FLAG:
+            self.port = f"SIM-{self.flasherSerial}"
+        elif UART_FLAG:
+            port = portRegistry.sharedRegistry().find(VALID_VID, VALID_PID, self.flasherSerial)
+            if port is not None:
+                self.port = port.name
+            else:
+                return f"COM port with serial {self.flasherSerial}, vid {VALID_VID}, pid {VALID_PID} not found. Ensure flashing boards are connected to the computer\n确认USB通信测试板与计算机连接"
+        return None
+
+    def PressureCheck(self, data_collection_time: float):
+        """Generator of one sample window, yields the seconds to wait, see runSteps
+        Returns:    None on success, error string otherwise"""
+        self.status = StationStatus.CHECK_PRESSURE
+        self.PressureAve = 0
+        self.PressureSTD = 0
+        if DYNAMIC_FLAG:
+            ValveSpeed = random.uniform(50,100)
+            if random.random() > 0.5:
+                ValveDirection = 1
+            else:
+                ValveDirection = -1
+            NozzleSpeed = random.uniform(20, 100)
+            if random.random() > 0.5:
+                NozzleDirection = 1
+            else:
+                NozzleDirection = -1
+            self.pyoto_instance.set_valve_duty(direction = ValveDirection, duty_cycle = ValveSpeed)
+            self.pyoto_instance.set_nozzle_duty(direction = NozzleDirection, duty_cycle = NozzleSpeed)
+        with self.timeStage("subscribe_settle"):
+            self.pyoto_instance.set_sensor_subscribe(subscribe_frequency=pyoto.SensorSubscribeFrequencyEnum.SENSOR_SUBSCRIBE_FREQUENCY_100Hz)
+            yield from self.waitForSensorStream(timeout = SETTLE_TIMEOUT)
+            self.pyoto_instance.clear_incoming_packet_log()
+        self.pressureWindow.clear()
+        windowStartTime = self.clock.time()
+        with self.timeStage("collect"):
+            yield from self.acquireSensorPackets(
+                self.pressureWindow,
+                sample_count = round(data_collection_time * SENSOR_RATE_HZ),
+                timeout = data_collection_time + ACQUISITION_MARGIN,
+            )
+        self.pyoto_instance.set_sensor_subscribe(subscribe_frequency=pyoto.SensorSubscribeFrequencyEnum.SENSOR_SUBSCRIBE_FREQUENCY_OFF)
+        self.pyoto_instance.clear_incoming_packet_log()
+        self.pyoto_instance.set_valve_duty(direction = 0, duty_cycle = 0)
+        self.pyoto_instance.set_nozzle_duty(direction = 0, duty_cycle = 0)
+        if not self.pressureWindow.count:
+            return "No pressure data was collected.\n未收集压力数值"
+        if self.rawArchive is not None:
+            self.rawArchive.append(self.pressureWindow.values, windowStartTime)
+        if LIMIT_CHECK_FLAG:
+            error = sensorLimits.checkWindow(self.sensorLimits, self.pressureWindow)
+            if error is not None:
+                return error
+        self.PressureAve = round(self.pressureWindow.meankPa(), 4)
+        self.PressureSTD = round(self.pressureWindow.stdkPa(), 5)
+        return None
+
+    def waitForSensorStream(self, timeout: float):
+        """Waits until the first sensor packet after subscribing arrives, or timeout elapses
+        Generator, yields the seconds to wait, see runSteps
+        Returns:    True if the stream started"""
+        deadline = self.clock.time() + timeout
+        while not self.pyoto_instance.read_all_sensor_packets(limit=1, consume=False):
+            if self.clock.time() >= deadline:
+                return False
+            yield SENSOR_POLL_INTERVAL
+        return True
+
+    def acquireSensorPackets(self, window: pressureStats.PressureWindow, sample_count: int, timeout: float):
+        """Adds sensor packets to window until it holds sample_count or timeout elapses
+        Waits until the missing packets are due at SENSOR_RATE_HZ instead of polling,
+        so a window ends as soon as it is full
+        Generator, yields the seconds to wait, see runSteps
+        Returns:    number of samples in window"""
+        deadline = self.clock.time() + timeout
+        while True:
+            window.extend(self.pyoto_instance.read_all_sensor_packets(limit=sample_count - window.count, consume=True))
+            missing = sample_count - window.count
+            remaining_time = deadline - self.clock.time()
+            if missing <= 0 or remaining_time <= 0:
+                return window.count
+            yield min(max(missing / SENSOR_RATE_HZ, SENSOR_POLL_INTERVAL), remaining_time)
+
+    def newInterface(self):
+        """Creates the device interface of a UART or simulated connection"""
+        if self.interfaceFactory is not None:
+            return self.interfaceFactory(self.clock)
+        elif SIM_FLAG:
+            return otoSimulator.SimulatedOtoInterface(profile=SIM_PROFILE, clock=self.clock)
+        return pyoto.OtoInterface(connection_type=pyoto.ConnectionType.UART, logger=None)
+
+    def makeInterface(self):
+        """Creates the device interface, recorded if RECORD_DIR is set"""
+        return self.recordSession(self.newInterface())
+
+    def recordSession(self, interface):
+        """Wraps interface in a session capture if RECORD_DIR is set"""
+        self.closeSessionCapture()
+        if RECORD_DIR is not None:
+            interface = sessionCapture.RecordingOtoInterface(
+                interface,
+                os.path.join(RECORD_DIR, f"{self.flasherSerial} {int(self.clock.time())}.jsonl"),
+                header = {
+                    "flasher_serial": self.flasherSerial,
+                    "start_time": self.clock.time(),
+                    "total_time": TOTALTIME,
+                    "time_interval": TIMEINTERVAL,
+                    "sensor_rate_hz": SENSOR_RATE_HZ,
+                },
+            )
+        return interface
+
+    def reuseConnection(self):
+        """Takes the cached connection of self.port and probes it
+        Returns:    MAC address reply of the probe, None if there is no live cached connection"""
+        if not REUSE_CONNECTION_FLAG or self.interfaceFactory is not None:
+            return None
+        interface = CONNECTION_CACHE.take(self.port)
+        if interface is None:
+            return None
+        self.pyoto_instance = self.recordSession(interface)
+        try:
+            macReply = self.pyoto_instance.get_mac_address()
+        except Exception:
+            self.logger.warning("Open connection not responding, rebooting board\n连接无响应, 重启线路板", exc_info=True)
+            connectionCache.closeConnection(interface)
+            self.closeSessionCapture()
+            self.pyoto_instance = None
+            return None
+        self.logger.info("Reusing open connection\n使用已有连接")
+        return macReply
+
+    def releaseConnection(self):
+        """Hands the connection of a finished run to CONNECTION_CACHE for the next run"""
+        self.closeSessionCapture()
+        if not REUSE_CONNECTION_FLAG or self.interfaceFactory is not None or self.pyoto_instance is None:
+            return
+        interface = self.pyoto_instance
+        if isinstance(interface, sessionCapture.RecordingOtoInterface):
+            interface = interface.interface
+        CONNECTION_CACHE.put(self.port, interface)
+        self.pyoto_instance = None
+
+    def bringUp(self, macReply = None):
+        """Reads the MAC address, battery voltage and sensor version and enables the moving average filter
+        Sent as one CommandBatch, the sensor version reply is kept for getPressureSensorVersion
+        Args:       macReply: get_mac_address reply if the MAC was already read
+        Raises:     the first error of a command other than get_pressure_sensor_version"""
+        batch = commandBatch.CommandBatch(self.pyoto_instance)
+        if macReply is None:
+            batch.add("get_mac_address")
+        batch.add("get_voltages")
+        batch.add("use_moving_average_filter", True)
+        batch.add("get_pressure_sensor_version")
+        *replies, self.sensorVersionReply = batch.run()
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        if macReply is None:
+            macReply = replies.pop(0)
+        self.MACAddress = macReply.string
+        self.batteryVoltage = float(replies[0].battery_voltage_v)
+        self.logger.info(f"Battery: {round(self.batteryVoltage, 2)} V")
+
+    def startConnection(self, **kwargs):
+        """Generator of pyoto_instance.start_connection, yields the reboot wait if the interface
+        hands it out as steps like the simulator; pyoto's OtoInterface waits for the reboot inside
+        its blocking start_connection"""
+        steps = getattr(self.pyoto_instance, "start_connection_steps", None)
+        if steps is None:
+            return self.pyoto_instance.start_connection(**kwargs)
+        return (yield from steps(**kwargs))
+
+    def OtOConnect(self):
+        """Generator, yields the seconds to wait, see runSteps
+        Returns:    None on success, error string otherwise"""
+        if self.interfaceFactory is not None or UART_FLAG or SIM_FLAG:
+            try:
+                with self.timeStage("connect"):
+                    macReply = self.reuseConnection()
+                    if macReply is None:
+                        self.pyoto_instance = self.makeInterface()
+                        # self.pyoto_instance.logger.setLevel(logging.INFO)
+                        self.logger.info("Waiting for board to reboot...\n等待线路板重启")
+                        yield from self.startConnection(port=self.port, reset_on_connect=True)
+                self.status = StationStatus.CONNECTED
+                with self.timeStage("bring_up"):
+                    self.bringUp(macReply)
+            except Exception as error:
+                self.logger.exception("Failed to connect to board\n连接线路板失败")
+                return f"Failed to connect to board on port {self.port}:\n连接线路板失败\n{repr(error)}"
+        else:
+            try:
+                with self.timeStage("connect"):
+                    self.pyoto_instance = pyoto.OtoInterface(connection_type=pyoto.ConnectionType.BLE, logger=None)
+                    # self.pyoto_instance.logger.setLevel(logging.INFO)
+                    self.logger.info("Waiting for board to reboot...\n等待线路板重启")
+                    yield from self.startConnection(device_id=TARGET_UNIT, reset_on_connect=True)
+                self.status = StationStatus.CONNECTED
+                with self.timeStage("bring_up"):
+                    self.bringUp()
+            except pyoto.otoBle.OtoNotFoundError as e:
+                print(f"\033[31mOtO {TARGET_UNIT} BLE not running! Try flicking switch and ensure you have the right unit number\033[0m")
+                return
+            except Exception as error:
+                self.logger.exception("Unhandled error! Failed to connect to board\n连接线路板失败")
+                return f"Failed to connect to board on port {self.port}:\n连接线路板失败\n{repr(error)}"
+            
+
+
+
+    def getPressureSensorVersion(self):
+        # assumes pyoto connection is open, uses the reply read by bringUp if there is one
+        return_message, self.sensorVersionReply = self.sensorVersionReply, None
+        try:
+            if return_message is None:
+                return_message = self.pyoto_instance.get_pressure_sensor_version()
+            elif isinstance(return_message, Exception):
+                raise return_message
+        except Exception as error:
+            self.logger.exception("Failed to get pressure sensor address\n无法获得压力传感器地址")
+            return f"Failed to get pressure sensor address on port {self.port}:\n无法获得压力传感器地址\n{repr(error)}"
+        returned_pressure_sensor_version = return_message.pressure_sensor_version  # should be an int
+        # see PressureSensorVersionEnum in otoMessageDefs for breakdown
+        if returned_pressure_sensor_version == otoMessageDefs.PressureSensorVersionEnum.PRESSURE_SENSOR_UNINITIALIZED.value:
+            return "Uninitialized pressure sensor\n压力传感器未能启动"
+        elif returned_pressure_sensor_version in sensorLimits.OLD_DESIGN_SENSOR_VERSIONS:
+            return "This is an old design board and cannot be tested on this station."
+        elif returned_pressure_sensor_version in sensorLimits.PRESSURE_SENSOR_LIMITS:
+            self.pressureSensorVersion = returned_pressure_sensor_version
+            self.sensorLimits = sensorLimits.PRESSURE_SENSOR_LIMITS[returned_pressure_sensor_version]
+            self.GaugeRange = self.sensorLimits.gauge_range
+            return None
+        else:
+            return "Unknown pressure sensor detected\n检查到未知压力传感器"
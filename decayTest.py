@@ -0,0 +1,206 @@
+"""Runs decay tests without a GUI
+
+Loads the flasher boards from config.yml, tests every station with the
+TestOrchestrator, or with stationWorkers worker processes, and writes the
+results like the GUI does: per-unit CSV files, the results database and raw
+archives, as set in decayEngine.py. Station logs go to the console. The exit
+status is 0 when every station passed.
+
+    python decayTest.py --config config.yml
+    python decayTest.py --continuous --processes 4
+
+DecayOverall.py is the Tk front end on top of the same functions."""
+
+import startupBudget  # first, its import time stands in for the launch time
+import argparse
+import logging
+import sys
+import threading
+from typing import List
+
+import acquisitionScheduler
+import configClass
+import decayEngine
+import otoSimulator
+import resultsStore
+import testOrchestrator
+
+logger = logging.getLogger(__name__)
+
+
+def loadFlasherSerials(path: str = "config.yml") -> List[str]:
+    """Returns the USB serials of the flasher_list in the config file, simulated boards if SIM_FLAG is set
+    Raises:     FileNotFoundError if the file doesn't exist
+                ValueError if the file has no flasher boards
+                Exception on yaml file read/parse error"""
+    if decayEngine.SIM_FLAG:
+        return [flasher.serial for flasher in otoSimulator.simulatedFlasherList(decayEngine.SIM_STATIONS)]
+    config = configClass.OtoFlasherConfigObject()
+    config.yaml_file_path = path
+    config.from_yaml_file()
+    serials = [flasher.serial for flasher in config.flasher_list if flasher.serial]
+    if not serials:
+        raise ValueError(f"{path} has no flasher boards  没有治具")
+    return serials
+
+
+def makeOrchestrator(io_workers: int = 20, max_windows: int = None) -> testOrchestrator.TestOrchestrator:
+    """Returns a TestOrchestrator with an AcquisitionScheduler set up from the decayEngine settings
+    Args:       io_workers: serial I/O threads shared by the stations
+                max_windows: max sample windows acquiring at once, MAX_CONCURRENT_WINDOWS if None"""
+    scheduler = acquisitionScheduler.AcquisitionScheduler(
+        max_windows if max_windows is not None else decayEngine.MAX_CONCURRENT_WINDOWS,
+        decayEngine.WINDOW_SLOT_TIME,
+        decayEngine.TIMEINTERVAL,
+        metrics=decayEngine.STAGE_METRICS,
+    )
+    return testOrchestrator.TestOrchestrator(io_workers=io_workers, scheduler=scheduler)
+
+
+def makeStations(serials: List[str], results_store: resultsStore.ResultsStore = None) -> List[decayEngine.DecayStation]:
+    """Returns a DecayStation per serial, labelled with its 1-based position like the GUI cards"""
+    return [
+        decayEngine.DecayStation(serial, label=str(index + 1), results_store=results_store)
+        for index, serial in enumerate(serials)
+    ]
+
+
+def runStations(serials: List[str], io_workers: int = 20) -> List:
+    """Runs one decay test on every station in this process and blocks until all are done
+    Returns:    list with one result per station, None on success, error string otherwise"""
+    store = resultsStore.ResultsStore(decayEngine.RESULTS_DB_PATH) if decayEngine.RESULTS_DB_PATH else None
+    try:
+        stations = makeStations(serials, store)
+        results = makeOrchestrator(io_workers).run(stations)
+        for station, result in zip(stations, results):
+            if result is None:
+                station.status = decayEngine.StationStatus.SUCCESS
+        return results
+    finally:
+        decayEngine.CONNECTION_CACHE.closeAll()
+        if store is not None:
+            store.close()
+
+
+def runStationsContinuous(serials: List[str], stop: threading.Event, io_workers: int = 20):
+    """Tests every newly seated unit on each station in this process until stop is set"""
+    store = resultsStore.ResultsStore(decayEngine.RESULTS_DB_PATH) if decayEngine.RESULTS_DB_PATH else None
+    try:
+        makeOrchestrator(io_workers).runContinuous(
+            makeStations(serials, store), stop, poll_interval=decayEngine.UNIT_POLL_INTERVAL
+        )
+    finally:
+        decayEngine.CONNECTION_CACHE.closeAll()
+        if store is not None:
+            store.close()
+
+
+def runWorkers(
+    serials: List[str], processes: int, io_workers: int, continuous: bool, stop: threading.Event, settings: dict = None
+) -> List:
+    """Runs the stations in stationWorkers worker processes, logs come back to this process's station loggers
+    Args:       settings: decayEngine settings changed at run time, the workers set them too
+    Returns:    list with one result per station, all None for a continuous run"""
+    import stationWorkers  # imported here, stationWorkers imports this module
+
+    finished = threading.Event()
+    results = [None] * len(serials)
+
+    def onFinished(workerResults: list):
+        results[:] = workerResults
+        finished.set()
+
+    supervisor = stationWorkers.StationSupervisor(
+        serials,
+        [str(index + 1) for index in range(len(serials))],
+        processes=processes,
+        io_workers=io_workers,
+        on_log=lambda index, record: logHere(logging.getLogger(serials[index]), record),
+        on_finished=onFinished,
+        settings=settings,
+    ).start()
+    try:
+        if continuous:
+            supervisor.runContinuous()
+            stop.wait()
+            supervisor.stopContinuous()
+        else:
+            supervisor.runAll()
+        finished.wait()
+        return results
+    finally:
+        supervisor.close()
+
+
+def logHere(stationLogger: logging.Logger, record: logging.LogRecord):
+    """Handles a worker's log record in this process, filtered by the level set here"""
+    if stationLogger.isEnabledFor(record.levelno):
+        stationLogger.handle(record)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="decay-test", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default="config.yml", help="config file with the flasher_list, default config.yml")
+    parser.add_argument("--continuous", action="store_true", help="test every newly seated unit until Ctrl+C")
+    parser.add_argument("--processes", type=int, default=0, help="worker processes to split the stations across, 0 runs them all in this process")
+    parser.add_argument("--workers", type=int, default=20, help="serial I/O threads per process, shared by its stations")
+    parser.add_argument("--results-db", help="results database path, RESULTS_DB_PATH if not given")
+    parser.add_argument("--no-csv", action="store_true", help="don't write the per-unit results CSV files")
+    parser.add_argument("--quiet", action="store_true", help="only show warnings and errors of the stations")
+    args = parser.parse_args(argv)
+    startupBudget.mark("imports")
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(name)s: %(message)s")
+    settings = dict()
+    if args.results_db:
+        settings["RESULTS_DB_PATH"] = args.results_db
+    if args.no_csv:
+        settings["CSV_OUTPUT_FLAG"] = False
+    for name, value in settings.items():
+        setattr(decayEngine, name, value)
+
+    try:
+        serials = loadFlasherSerials(args.config)
+        startupBudget.mark("config")
+    except FileNotFoundError:
+        print(f"File {args.config} not found.  文件未找到", file=sys.stderr)
+        return 2
+    except Exception as error:
+        print(f"{args.config} is not in a valid format: {error}", file=sys.stderr)
+        return 2
+
+    startupBudget.reportReady(logger, decayEngine.STARTUP_BUDGET)
+    stop = threading.Event()
+    if args.processes:
+        runner = lambda: runWorkers(serials, args.processes, args.workers, args.continuous, stop, settings)
+    elif args.continuous:
+        runner = lambda: runStationsContinuous(serials, stop, args.workers)
+    else:
+        runner = lambda: runStations(serials, args.workers)
+
+    # run off the main thread so Ctrl+C can stop continuous testing cleanly
+    outcome = dict()
+    thread = threading.Thread(target=lambda: outcome.setdefault("results", runner()), name="decay-test")
+    thread.start()
+    while thread.is_alive():
+        try:
+            thread.join(0.5)
+        except KeyboardInterrupt:
+            if not args.continuous or stop.is_set():
+                raise
+            logger.warning("Stopping, running tests are finished first  停止中")
+            stop.set()
+
+    results = outcome.get("results") or [None] * len(serials)
+    failed = 0
+    for index, (serial, result) in enumerate(zip(serials, results)):
+        if result is not None:
+            failed += 1
+            print(f"{index + 1} {serial}: FAIL {result.splitlines()[0]}")
+        elif not args.continuous:
+            print(f"{index + 1} {serial}: PASS")
+    return 1 if failed or "results" not in outcome else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
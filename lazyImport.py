@@ -0,0 +1,33 @@
+"""Deferred imports of heavy modules
+
+lazyModule returns a stand-in module right away and imports the real one
+on the first attribute access. A station only pays for NumPy, pyoto,
+pyserial or PyYAML when it first uses them, and never for the ones its
+settings don't need (the pyoto interface in simulation, pyserial without
+UART_FLAG, PyYAML with a current config snapshot).
+
+The real import goes through importlib.import_module, whose module locks
+make the first access safe from several serial I/O threads at once; the
+stand-in then copies the module's attributes so later lookups are plain
+attribute reads. A missing module still raises ModuleNotFoundError at
+the lazyModule call, like a normal import statement."""
+
+import importlib
+import importlib.util
+import types
+
+
+class _LazyModule(types.ModuleType):
+    def __getattr__(self, attribute: str):
+        # only called for attributes not copied yet
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazyModule(name: str) -> types.ModuleType:
+    """Returns a stand-in for the module name that imports it on first attribute access
+    Raises:     ModuleNotFoundError if the module doesn't exist"""
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return _LazyModule(name)
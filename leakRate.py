@@ -0,0 +1,118 @@
+"""Incremental least-squares leak rate estimator
+
+LeakRateFit fits a straight line through every (time, pressure) sample of a
+decay run, weighting each sample by 1/STD^2, and keeps only running sums so
+adding a sample and reading the slope and its confidence interval are O(1)."""
+
+import math
+from enum import Enum
+
+# Coverage factor of the reported errors, same as the ±2.75σ used in DecayOverall
+COVERAGE = 2.75
+
+# Floor on a sample's STD in kPa, keeps a stuck sensor from getting infinite weight
+MIN_STD = 1e-6
+
+
+class LeakRateFit:
+    """Weighted least-squares fit of pressure (kPa) against time (hours)
+    The leak rate is the negative slope in kPa/hr, positive when pressure drops.
+    With more than two samples the error is scaled up by the reduced chi-square
+    when the scatter around the line is larger than the STDs account for."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._t0 = 0.0
+        self._p0 = 0.0
+        self._sw = 0.0
+        self._swt = 0.0
+        self._swp = 0.0
+        self._swtt = 0.0
+        self._swtp = 0.0
+        self._swpp = 0.0
+
+    def add(self, hours: float, pressure: float, std: float):
+        """Adds one sample
+        Args:       hours: time of the sample since the start of the run
+                    pressure: average pressure of the sample window in kPa
+                    std: standard deviation of the sample window in kPa"""
+        if not self.count:
+            # Work relative to the first sample to keep the sums well conditioned
+            self._t0 = hours
+            self._p0 = pressure
+        t = hours - self._t0
+        p = pressure - self._p0
+        w = 1.0 / max(std, MIN_STD) ** 2
+        self.count += 1
+        self._sw += w
+        self._swt += w * t
+        self._swp += w * p
+        self._swtt += w * t * t
+        self._swtp += w * t * p
+        self._swpp += w * p * p
+
+    @property
+    def ready(self) -> bool:
+        """True once the samples span enough time to define a slope"""
+        return self.count >= 2 and self._delta() > 0
+
+    def _delta(self) -> float:
+        return self._sw * self._swtt - self._swt * self._swt
+
+    def slope(self) -> float:
+        """Fitted slope in kPa/hr, 0 until ready"""
+        if not self.ready:
+            return 0.0
+        return (self._sw * self._swtp - self._swt * self._swp) / self._delta()
+
+    @property
+    def rate(self) -> float:
+        """Leak rate in kPa/hr"""
+        return -self.slope()
+
+    @property
+    def rateError(self) -> float:
+        """Half width of the leak rate confidence interval in kPa/hr, 0 until ready"""
+        if not self.ready:
+            return 0.0
+        delta = self._delta()
+        variance = self._sw / delta
+        if self.count > 2:
+            slope = self.slope()
+            intercept = (self._swp - slope * self._swt) / self._sw
+            chi_square = self._swpp - intercept * self._swp - slope * self._swtp
+            variance *= max(1.0, chi_square / (self.count - 2))
+        return COVERAGE * math.sqrt(variance)
+
+    def interval(self):
+        """Returns:    (low, high) bounds of the leak rate in kPa/hr"""
+        rate = self.rate
+        error = self.rateError
+        return rate - error, rate + error
+
+
+class StopReason(Enum):
+    """Why a decay run ended"""
+    FULL_DURATION = "full duration"
+    PASS_BELOW_LIMIT = "leak rate interval below limit"
+    FAIL_ABOVE_LIMIT = "leak rate interval above limit"
+
+
+def sequentialDecision(fit: LeakRateFit, max_rate: float):
+    """Sequential pass/fail check, meant to be called after every sample
+    Repeated looks at the data widen the real error rate, callers should only
+    start checking after a minimum test time
+    Args:       fit: leak rate fit of the run so far
+                max_rate: acceptance limit in kPa/hr
+    Returns:    StopReason once the interval lies entirely below or above max_rate, None otherwise"""
+    if not fit.ready:
+        return None
+    low, high = fit.interval()
+    if high < max_rate:
+        return StopReason.PASS_BELOW_LIMIT
+    if low > max_rate:
+        return StopReason.FAIL_ABOVE_LIMIT
+    return None
@@ -0,0 +1,260 @@
+"""Simulated OtO device for running DecayOverall without flasher boards
+
+SimulatedOtoInterface implements the subset of pyoto.OtoInterface used by
+SerialBoardCard, and streams pressure packets that follow a configurable leak,
+sensor noise and drift model. Faults can be injected to exercise error paths."""
+
+import random
+import threading
+import zlib
+from types import SimpleNamespace
+from typing import List
+
+import configClass
+import virtualClock
+from pressureStats import ADCtokPa, OUTPUTMIN
+
+try:
+    import pyoto.otoProtocol.otoMessageDefs as otoMessageDefs
+except ImportError:  # pyoto submodule not checked out
+    otoMessageDefs = None
+
+
+class SimulatedFaultError(ConnectionError):
+    """Raised by the simulator when a connection fault is injected"""
+
+
+class SimulationProfile:
+    """Describes how simulated units behave
+
+    Args:       start_pressure: gauge pressure in kPa when the unit is connected
+                leak_rate: pressure loss in kPa/hr
+                leak_rate_spread: fractional unit to unit spread of leak_rate
+                noise_adc: standard deviation of the sensor noise in ADC counts
+                drift: sensor drift in kPa/hr, added on top of the leak
+                battery_voltage: reported battery voltage in V
+                reboot_time: seconds a reset_on_connect takes
+                command_latency: seconds each request/response call takes
+                connect_fail_rate: probability that start_connection raises
+                dropout_rate: probability that a subscription delivers no packets
+                spike_rate: probability of an outlier on each packet
+                spike_adc: size of an outlier in ADC counts
+                stuck_rate: probability that the sensor is stuck for a whole connection
+                sensor_version: reported pressure sensor version, MPRL 30 psi if None
+                unit_swap_interval: seconds after which the operator seats the next unit on a fixture,
+                    None keeps one unit per fixture"""
+
+    def __init__(
+        self,
+        start_pressure: float = 50.0,
+        leak_rate: float = 0.05,
+        leak_rate_spread: float = 0.5,
+        noise_adc: float = 240.0,
+        drift: float = 0.0,
+        battery_voltage: float = 4.1,
+        reboot_time: float = 2.0,
+        command_latency: float = 0.0,
+        connect_fail_rate: float = 0.0,
+        dropout_rate: float = 0.0,
+        spike_rate: float = 0.0,
+        spike_adc: float = 50000.0,
+        stuck_rate: float = 0.0,
+        sensor_version: int = None,
+        unit_swap_interval: float = None,
+    ) -> None:
+        self.start_pressure = start_pressure
+        self.leak_rate = leak_rate
+        self.leak_rate_spread = leak_rate_spread
+        self.noise_adc = noise_adc
+        self.drift = drift
+        self.battery_voltage = battery_voltage
+        self.reboot_time = reboot_time
+        self.command_latency = command_latency
+        self.connect_fail_rate = connect_fail_rate
+        self.dropout_rate = dropout_rate
+        self.spike_rate = spike_rate
+        self.spike_adc = spike_adc
+        self.stuck_rate = stuck_rate
+        if sensor_version is None and otoMessageDefs is not None:
+            sensor_version = otoMessageDefs.PressureSensorVersionEnum.MPRL_30_PSI_GAUGE.value
+        self.sensor_version = sensor_version
+        self.unit_swap_interval = unit_swap_interval
+
+
+class SimulatedSensorReadMessage:
+    """Stand-in for otoMessageDefs.SensorReadMessage"""
+
+    __slots__ = ("pressure_adc", "timestamp")
+
+    def __init__(self, pressure_adc: int, timestamp: float) -> None:
+        self.pressure_adc = pressure_adc
+        self.timestamp = timestamp
+
+
+def subscribeFrequencyHz(subscribe_frequency) -> float:
+    """Returns the packet rate in Hz of a SensorSubscribeFrequencyEnum member
+    Members are named like SENSOR_SUBSCRIBE_FREQUENCY_100Hz or ..._OFF"""
+    name = getattr(subscribe_frequency, "name", str(subscribe_frequency))
+    suffix = name.rsplit("_", 1)[-1]
+    if suffix.upper().endswith("HZ"):
+        return float(suffix[:-2])
+    return 0.0
+
+
+def simulatedFlasherList(count: int) -> List[configClass.OtoFlasherObject]:
+    """Returns a flasher list of count virtual flasher boards"""
+    return [
+        configClass.OtoFlasherObject(vid="0x10c4", pid="0xea60", serial=f"SIM{index:04d}")
+        for index in range(count)
+    ]
+
+
+class SimulatedOtoInterface:
+    """Drop-in replacement for pyoto.OtoInterface backed by a pressure model"""
+
+    def __init__(self, profile: SimulationProfile = None, logger=None, clock: virtualClock.SystemClock = None) -> None:
+        self.profile = profile if profile is not None else SimulationProfile()
+        self.clock = clock if clock is not None else virtualClock.SystemClock()
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._connected = False
+        self._mac = None
+        self._leak_rate = self.profile.leak_rate
+        self._connect_time = 0.0
+        self._moving_average = False
+        self._rate_hz = 0.0
+        self._next_packet_time = 0.0
+        self._dropout = False
+        self._stuck_adc = None
+        self._seed = 0
+        self._unit = 0
+        self._packet_log: List[SimulatedSensorReadMessage] = list()
+
+    def start_connection(self, port: str = None, device_id: str = None, reset_on_connect: bool = True):
+        """Connects to the simulated unit, seeded from port or device_id so each
+        station gets its own reproducible unit"""
+        for delay in self.start_connection_steps(port=port, device_id=device_id, reset_on_connect=reset_on_connect):
+            self.clock.sleep(delay)
+
+    def start_connection_steps(self, port: str = None, device_id: str = None, reset_on_connect: bool = True):
+        """Generator of start_connection, yields the seconds the reboot takes instead of sleeping
+        through them, so the caller can wait on its own clock without holding a thread"""
+        target = port if port is not None else device_id
+        self._seed = zlib.crc32(str(target).encode())
+        self._random.seed(self._seed)
+        if self._random.random() < self.profile.connect_fail_rate:
+            raise SimulatedFaultError(f"Injected connection fault on {target}")
+        if reset_on_connect:
+            yield self.profile.reboot_time
+        self._seatUnit(self._unitOnFixture())
+        self._rate_hz = 0.0
+        self._packet_log.clear()
+        self._connected = True
+
+    def _unitOnFixture(self) -> int:
+        if not self.profile.unit_swap_interval:
+            return 0
+        return int(self.clock.time() // self.profile.unit_swap_interval)
+
+    def _seatUnit(self, unit: int):
+        """Models the unit with number unit on the fixture, each unit has its own MAC and leak rate"""
+        self._unit = unit
+        seed = (self._seed + unit * 0x9E3779B1) & 0xFFFFFFFF
+        self._mac = ":".join(f"{byte:02X}" for byte in (0x02, 0x00, *seed.to_bytes(4, "big")))
+        spread = self.profile.leak_rate_spread
+        self._leak_rate = self.profile.leak_rate * (1 + self._random.uniform(-spread, spread))
+        if self._random.random() < self.profile.stuck_rate:
+            self._stuck_adc = int(self._pressureToADC(self.profile.start_pressure))
+        else:
+            self._stuck_adc = None
+        self._connect_time = self.clock.time()
+
+    def end_connection(self):
+        self._connected = False
+        self._rate_hz = 0.0
+
+    # ---- Request / response commands ----
+
+    def _command(self):
+        if not self._connected:
+            raise SimulatedFaultError("Simulated unit is not connected")
+        if self.profile.command_latency:
+            self.clock.sleep(self.profile.command_latency)
+
+    def get_mac_address(self):
+        self._command()
+        unit = self._unitOnFixture()
+        if unit != self._unit:
+            self._seatUnit(unit)
+        return SimpleNamespace(string=self._mac)
+
+    def get_voltages(self):
+        self._command()
+        return SimpleNamespace(battery_voltage_v=self.profile.battery_voltage)
+
+    def get_pressure_sensor_version(self):
+        self._command()
+        return SimpleNamespace(pressure_sensor_version=self.profile.sensor_version)
+
+    def use_moving_average_filter(self, enable: bool):
+        self._command()
+        self._moving_average = bool(enable)
+
+    def set_valve_duty(self, direction: int = 0, duty_cycle: float = 0):
+        self._command()
+
+    def set_nozzle_duty(self, direction: int = 0, duty_cycle: float = 0):
+        self._command()
+
+    def set_sensor_subscribe(self, subscribe_frequency=None):
+        self._command()
+        with self._lock:
+            self._generatePackets(self.clock.time())
+            self._rate_hz = subscribeFrequencyHz(subscribe_frequency)
+            self._next_packet_time = self.clock.time()
+            self._dropout = self._random.random() < self.profile.dropout_rate
+
+    # ---- Packet stream ----
+
+    def clear_incoming_packet_log(self):
+        with self._lock:
+            self._generatePackets(self.clock.time())
+            self._packet_log.clear()
+
+    def read_all_sensor_packets(self, limit: int = None, consume: bool = True) -> List[SimulatedSensorReadMessage]:
+        with self._lock:
+            self._generatePackets(self.clock.time())
+            if limit is None:
+                packets = list(self._packet_log)
+            else:
+                packets = self._packet_log[:limit]
+            if consume:
+                del self._packet_log[: len(packets)]
+        return packets
+
+    def _pressureToADC(self, pressure: float) -> float:
+        return OUTPUTMIN + pressure / ADCtokPa
+
+    def _generatePackets(self, now: float):
+        """Appends every packet due up to now to the packet log"""
+        if self._rate_hz <= 0 or not self._connected:
+            return
+        period = 1.0 / self._rate_hz
+        profile = self.profile
+        noise = profile.noise_adc * (0.5 if self._moving_average else 1.0)
+        while self._next_packet_time <= now:
+            timestamp = self._next_packet_time
+            self._next_packet_time += period
+            if self._dropout:
+                continue
+            if self._stuck_adc is not None:
+                adc = self._stuck_adc
+            else:
+                hours = (timestamp - self._connect_time) / 3600
+                pressure = profile.start_pressure - (self._leak_rate - profile.drift) * hours
+                adc = self._pressureToADC(pressure) + self._random.gauss(0, noise)
+                if profile.spike_rate and self._random.random() < profile.spike_rate:
+                    adc += self._random.choice((-1, 1)) * profile.spike_adc
+            adc = min(max(adc, 0), 2**24 - 1)
+            self._packet_log.append(SimulatedSensorReadMessage(int(adc), timestamp))
@@ -0,0 +1,192 @@
+"""Registry of connected USB serial ports
+
+Keeps the ports of serial.tools.list_ports.comports() in dicts indexed by
+(VID, PID, serial number), so finding a flasher board is a dict lookup
+instead of a scan over every port. One background thread keeps it current:
+on Linux it rescans when the kernel reports a tty hotplug event over
+netlink. Elsewhere, or when netlink is not available, there are no hotplug
+events: the thread calls comports() every POLL_INTERVAL for as long as the
+process runs, a full port enumeration each time.
+
+Subscribers are called with (added, removed) dicts of PortKey to port on
+every change, from the watcher thread. A board replugged between two scans
+that comes back under another device name (e.g. /dev/ttyUSB3 instead of
+/dev/ttyUSB1) is in both, removed with its old port and added with its new
+one. waitForChange lets a thread block until the next change instead."""
+
+import logging
+import select
+import socket
+import sys
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import serial.tools.list_ports
+
+POLL_INTERVAL = 1.0  # seconds between rescans when hotplug events are not available
+SETTLE_TIME = 0.2  # seconds to wait after a hotplug event for the rest of its burst
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_SUBSYSTEMS = (b"SUBSYSTEM=tty", b"SUBSYSTEM=usb-serial")
+
+logger = logging.getLogger(__name__)
+
+
+class PortKey(NamedTuple):
+    vid: int
+    pid: int
+    serial_number: str
+
+
+class PortRegistry:
+    def __init__(self, poll_interval: float = POLL_INTERVAL) -> None:
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._ports: Dict[PortKey, object] = dict()
+        self._byVidPid: Dict[tuple, Dict[str, object]] = dict()
+        self._subscribers: List[Callable] = list()
+        self._thread: threading.Thread = None
+        self._stop = threading.Event()
+        self.version = 0
+
+    # ---- Queries ----
+
+    def find(self, vid: int, pid: int, serial_number: str):
+        """Returns the port with the given VID, PID and serial number, None if it is not connected"""
+        with self._lock:
+            return self._ports.get(PortKey(vid, pid, serial_number))
+
+    def ports(self, vid: int = None, pid: int = None) -> list:
+        """Returns all ports, or those matching vid and pid"""
+        with self._lock:
+            if vid is not None and pid is not None:
+                return list(self._byVidPid.get((vid, pid), {}).values())
+            return [
+                port for key, port in self._ports.items()
+                if (vid is None or key.vid == vid) and (pid is None or key.pid == pid)
+            ]
+
+    def serialNumbers(self, vid: int = None, pid: int = None) -> List[str]:
+        return [port.serial_number for port in self.ports(vid, pid)]
+
+    # ---- Change notification ----
+
+    def subscribe(self, callback: Callable):
+        """Calls callback(added, removed) on every change, from the watcher thread"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def waitForChange(self, version: int, timeout: float = None) -> int:
+        """Blocks until the registry version differs from version or timeout elapses
+        Returns:    current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    # ---- Watching ----
+
+    def start(self):
+        """Scans once, then keeps the registry current from a daemon thread"""
+        if self._thread is not None:
+            return self
+        self.rescan()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="port-registry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def rescan(self):
+        """Reads the connected ports and notifies subscribers if they changed"""
+        ports = dict()
+        for port in serial.tools.list_ports.comports():
+            if port.vid is None:
+                continue  # not a USB port
+            ports[PortKey(port.vid, port.pid, port.serial_number)] = port
+        with self._lock:
+            # a key whose device changed was replugged, its cached port is stale
+            added = {key: port for key, port in ports.items() if _device(self._ports.get(key)) != port.device}
+            removed = {key: port for key, port in self._ports.items() if _device(ports.get(key)) != port.device}
+            if not added and not removed:
+                return
+            self._ports = ports
+            byVidPid = dict()
+            for key, port in ports.items():
+                byVidPid.setdefault((key.vid, key.pid), dict())[key.serial_number] = port
+            self._byVidPid = byVidPid
+            self.version += 1
+            self._changed.notify_all()
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(added, removed)
+            except Exception:
+                logger.exception("Port registry subscriber failed")
+
+    def _watch(self):
+        uevents = _openUeventSocket()
+        try:
+            while not self._stop.is_set():
+                if uevents is None:
+                    self._stop.wait(self.poll_interval)
+                elif _waitForTtyEvent(uevents, self.poll_interval):
+                    # drain the burst of events of one plug before rescanning
+                    while _waitForTtyEvent(uevents, SETTLE_TIME):
+                        pass
+                else:
+                    continue
+                self.rescan()
+        except Exception:
+            logger.exception("Port registry watcher stopped")
+        finally:
+            if uevents is not None:
+                uevents.close()
+
+
+def _device(port) -> Optional[str]:
+    return port.device if port is not None else None
+
+
+def _openUeventSocket() -> Optional[socket.socket]:
+    """Returns a netlink socket receiving kernel hotplug events, None if not available"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        uevents = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        uevents.bind((0, 1))  # group 1: kernel events
+    except (OSError, AttributeError):
+        logger.info("Hotplug events not available, polling serial ports")
+        return None
+    return uevents
+
+
+def _waitForTtyEvent(uevents: socket.socket, timeout: float) -> bool:
+    """Returns True if a tty hotplug event arrived within timeout"""
+    readable, _, _ = select.select([uevents], [], [], timeout)
+    if not readable:
+        return False
+    message = uevents.recv(16384)
+    return any(subsystem in message for subsystem in UEVENT_SUBSYSTEMS)
+
+
+_sharedRegistry: PortRegistry = None
+_sharedLock = threading.Lock()
+
+
+def sharedRegistry() -> PortRegistry:
+    """Returns the started registry shared by everything in this process"""
+    global _sharedRegistry
+    with _sharedLock:
+        if _sharedRegistry is None:
+            _sharedRegistry = PortRegistry().start()
+        return _sharedRegistry
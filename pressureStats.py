@@ -0,0 +1,88 @@
+"""Streaming statistics for pressure sample windows
+
+PressureWindow stores the raw pressure_adc values of one sample window in a
+preallocated NumPy buffer and keeps the running mean and variance up to date
+as packets are added, so the result is ready the moment the window closes."""
+
+import lazyImport
+
+np = lazyImport.lazyModule("numpy")
+
+# MPRL 30 psi transfer function
+OUTPUTMIN = 0.1 * (2**24)
+ADCtokPa = 206.8427 / (0.8 * (2**24)) # 206.8427 kPa = 30 psi
+
+
+def tokPa(ADC):
+    """Converts ADC counts to kPa, works on scalars and NumPy arrays"""
+    return (ADC - OUTPUTMIN) * ADCtokPa
+
+
+class PressureWindow:
+    """Raw ADC values of one sample window with running mean and variance
+    Chunks of packets are merged into the running statistics with Chan's
+    parallel form of Welford's algorithm, one vectorized step per chunk."""
+
+    def __init__(self, capacity: int = 300) -> None:
+        self.capacity = max(1, capacity)
+        self.adc: "np.ndarray" = None # allocated by the first extend, so creating a station doesn't load NumPy
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def clear(self):
+        """Empties the window, keeps the buffer"""
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def extend(self, messages):
+        """Adds the pressure_adc of every SensorReadMessage in messages"""
+        new_count = len(messages)
+        if not new_count:
+            return
+        end = self.count + new_count
+        if self.adc is None:
+            self.adc = np.empty(max(end, self.capacity), dtype=np.int64)
+        elif end > len(self.adc):
+            grown = np.empty(max(end, 2 * len(self.adc)), dtype=np.int64)
+            grown[: self.count] = self.adc[: self.count]
+            self.adc = grown
+        chunk = self.adc[self.count : end]
+        chunk[:] = np.fromiter((message.pressure_adc for message in messages), dtype=np.int64, count=new_count)
+
+        chunk_mean = chunk.mean()
+        chunk_m2 = np.square(chunk - chunk_mean).sum()
+        delta = chunk_mean - self.mean
+        self.mean += delta * new_count / end
+        self._m2 += chunk_m2 + delta * delta * self.count * new_count / end
+        self.count = end
+
+    @property
+    def values(self) -> "np.ndarray":
+        """View of the raw ADC values collected so far"""
+        if self.adc is None:
+            return np.empty(0, dtype=np.int64)
+        return self.adc[: self.count]
+
+    @property
+    def variance(self) -> float:
+        """Population variance in ADC counts squared, same as np.var"""
+        if not self.count:
+            return 0.0
+        return self._m2 / self.count
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation in ADC counts, same as np.std"""
+        return float(np.sqrt(self.variance))
+
+    def pressures(self) -> "np.ndarray":
+        """All values of the window converted to kPa in one vectorized step"""
+        return tokPa(self.values.astype(np.float64))
+
+    def meankPa(self) -> float:
+        return float(tokPa(self.mean))
+
+    def stdkPa(self) -> float:
+        return ADCtokPa * self.std
@@ -0,0 +1,94 @@
+"""Raw pressure sample archive
+
+Keeps every raw pressure_adc value of a run, one chunk per sample window.
+A chunk is the delta encoded int32 samples of the window compressed with
+zlib, behind a small header, so appending a window costs one compress and
+one write. A truncated last chunk, e.g. after a crash, is skipped on read.
+
+File layout:
+    MAGIC
+    per window: CHUNK_HEADER (window start time, sample count, compressed size) + compressed deltas
+
+For analysis, openRawArchive expands the file once into .npy columns next
+to it and returns them memory-mapped."""
+
+import os
+import struct
+import zlib
+
+import lazyImport
+
+np = lazyImport.lazyModule("numpy")
+
+MAGIC = b"DRAW\x01\n"
+CHUNK_HEADER = struct.Struct("<dII")
+COMPRESSION_LEVEL = 1
+
+
+class RawArchiveWriter:
+    def __init__(self, path: str) -> None:
+        """Creates the archive at path, appends if it already exists"""
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+
+    def append(self, adc: "np.ndarray", start_time: float):
+        """Appends one sample window
+        Args:       adc: raw ADC values of the window
+                    start_time: epoch time the window started"""
+        deltas = np.diff(adc.astype("<i4", copy=False), prepend=np.int32(0)).astype("<i4", copy=False)
+        payload = zlib.compress(deltas.tobytes(), COMPRESSION_LEVEL)
+        self._file.write(CHUNK_HEADER.pack(start_time, len(adc), len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def readRawArchive(path: str):
+    """Reads a whole archive into memory
+    Returns:    (adc, window_offsets, window_times) where window i is
+                adc[window_offsets[i]:window_offsets[i + 1]]
+    Raises:     ValueError if path is not a raw archive"""
+    with open(path, "rb") as file_handler:
+        data = file_handler.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a raw pressure archive")
+    windows = []
+    times = []
+    position = len(MAGIC)
+    while position + CHUNK_HEADER.size <= len(data):
+        start_time, count, size = CHUNK_HEADER.unpack_from(data, position)
+        position += CHUNK_HEADER.size
+        if position + size > len(data):
+            break
+        deltas = np.frombuffer(zlib.decompress(data[position : position + size]), dtype="<i4")
+        position += size
+        if len(deltas) != count:
+            break
+        windows.append(np.cumsum(deltas, dtype=np.int32))
+        times.append(start_time)
+    offsets = np.zeros(len(windows) + 1, dtype=np.int64)
+    np.cumsum([len(window) for window in windows], out=offsets[1:])
+    adc = np.concatenate(windows) if windows else np.empty(0, dtype=np.int32)
+    return adc, offsets, np.array(times, dtype=np.float64)
+
+
+def openRawArchive(path: str):
+    """Returns the archive as memory-mapped arrays, see readRawArchive
+    The expanded .npy columns are cached next to the archive and rebuilt
+    when the archive is newer"""
+    columns = ("adc", "offsets", "times")
+    cache_paths = [f"{path}.{column}.npy" for column in columns]
+    archive_mtime = os.path.getmtime(path)
+    if not all(os.path.exists(cache) and os.path.getmtime(cache) >= archive_mtime for cache in cache_paths):
+        for cache, array in zip(cache_paths, readRawArchive(path)):
+            np.save(cache, array)
+    return tuple(np.load(cache, mmap_mode="r") for cache in cache_paths)
@@ -0,0 +1,79 @@
+"""Replays captured device sessions through the decay test
+
+Each capture written with decayEngine.RECORD_DIR set is run through a
+DecayStation on a discrete event clock, so sampling waits take no time and
+the replay is bound by the analysis only. Prints the outcome of every run
+and the replay rate in sensor samples per second.
+
+    python replaySessions.py captures/*.jsonl"""
+
+import argparse
+import logging
+import sys
+import time
+
+import decayEngine
+import sessionCapture
+import virtualClock
+
+
+def replaySession(path: str):
+    """Runs one capture through a DecayStation
+    Returns:    (station, error string or None, number of sensor samples replayed)"""
+    header, _ = sessionCapture.readCapture(path)
+    interfaces = []
+
+    def replayInterface(clock):
+        interface = sessionCapture.ReplayOtoInterface(path, clock=clock)
+        interfaces.append(interface)
+        return interface
+
+    station = decayEngine.DecayStation(
+        header.get("flasher_serial", path),
+        label=path,
+        clock=virtualClock.DiscreteEventClock(start=header.get("start_time")),
+        interface_factory=replayInterface,
+    )
+    error = station.runTest()
+    return station, error, sum(interface.samplesReplayed for interface in interfaces)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("captures", nargs="+", help="session capture files")
+    parser.add_argument("--write-results", action="store_true", help="write the results CSV and raw archive of each replay")
+    parser.add_argument("--verbose", action="store_true", help="show the log of each station")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    decayEngine.RECORD_DIR = None
+    decayEngine.METRICS_PATH = None
+    if not args.write_results:
+        decayEngine.CSV_OUTPUT_FLAG = False
+        decayEngine.RAW_ARCHIVE_FLAG = False
+
+    totalSamples = 0
+    startTime = time.perf_counter()
+    for path in args.captures:
+        header, _ = sessionCapture.readCapture(path)
+        # replay with the timing the capture was recorded with
+        decayEngine.TOTALTIME = header.get("total_time", decayEngine.TOTALTIME)
+        decayEngine.TIMEINTERVAL = header.get("time_interval", decayEngine.TIMEINTERVAL)
+        station, error, samples = replaySession(path)
+        totalSamples += samples
+        if station.leakFit.ready:
+            outcome = f"fit {round(station.leakFit.rate, 3)}±{round(station.leakFit.rateError, 4)} kPa/hr"
+        else:
+            outcome = "no fit"
+        if error is not None:
+            outcome += f", error: {error.splitlines()[0]}"
+        elif station.stopReason is not None:
+            outcome += f", {station.stopReason.value}"
+        print(f"{path}: {station.MACAddress}, {len(station.Pressures)} samples, {outcome}")
+    elapsed = time.perf_counter() - startTime
+    print(f"Replayed {totalSamples} sensor samples in {elapsed:.3f} s, {totalSamples / elapsed:.0f} samples/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
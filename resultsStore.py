@@ -0,0 +1,198 @@
+"""SQLite store for decay test results
+
+Every run, its samples and the station it ran on are written to one SQLite
+database, indexed by MAC, station and start time, so questions like
+"all units tested last week with a leak rate above X" are a single query
+instead of a scan over per-MAC CSV files.
+
+One ResultsStore is shared by all stations, calls are serialized with a lock.
+stationWorkers processes each open their own ResultsStore on the same
+file; a write that finds the database locked by another process waits up
+to BUSY_TIMEOUT for it instead of raising "database is locked"."""
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Union
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stations (
+    id INTEGER PRIMARY KEY,
+    flasher_serial TEXT NOT NULL UNIQUE,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    station_id INTEGER NOT NULL REFERENCES stations(id),
+    mac TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL,
+    sensor_version INTEGER,
+    battery_voltage REAL,
+    stop_reason TEXT,
+    fit_rate REAL,
+    fit_rate_error REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    time REAL NOT NULL,
+    elapsed REAL NOT NULL,
+    pressure REAL NOT NULL,
+    pressure_std REAL NOT NULL,
+    average_rate REAL,
+    rate_error REAL,
+    fit_rate REAL,
+    fit_rate_error REAL
+);
+CREATE INDEX IF NOT EXISTS runs_mac ON runs(mac);
+CREATE INDEX IF NOT EXISTS runs_station ON runs(station_id, start_time);
+CREATE INDEX IF NOT EXISTS runs_start_time ON runs(start_time);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run_id, time);
+"""
+
+Timestamp = Union[float, datetime]
+
+BUSY_TIMEOUT = 30.0  # seconds a statement waits for another process's write lock
+# error of a run that never reached finishRun, e.g. because the process died
+ABORTED_ERROR = "Run aborted before it finished\n测试中断"
+
+
+def _epoch(value: Timestamp) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+class ResultsStore:
+    def __init__(self, path: str = "results.db", busy_timeout: float = BUSY_TIMEOUT) -> None:
+        """Opens or creates the database at path
+        Args:       busy_timeout: seconds to wait for a lock held by another connection"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # ---- Writing ----
+
+    def startRun(
+        self,
+        flasher_serial: str,
+        label: str,
+        mac: str,
+        start_time: Timestamp,
+        sensor_version: int = None,
+        battery_voltage: float = None,
+    ) -> int:
+        """Records the start of a run
+        Runs of the station still open from before are marked aborted: error ABORTED_ERROR,
+        end_time left empty. A station runs one test at a time, so those never reached finishRun
+        Returns:    id of the new run"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO stations (flasher_serial, label) VALUES (?, ?) "
+                "ON CONFLICT(flasher_serial) DO UPDATE SET label = excluded.label",
+                (flasher_serial, label),
+            )
+            station_id = self._connection.execute(
+                "SELECT id FROM stations WHERE flasher_serial = ?", (flasher_serial,)
+            ).fetchone()[0]
+            self._connection.execute(
+                "UPDATE runs SET error = ? WHERE station_id = ? AND end_time IS NULL AND error IS NULL",
+                (ABORTED_ERROR, station_id),
+            )
+            cursor = self._connection.execute(
+                "INSERT INTO runs (station_id, mac, start_time, sensor_version, battery_voltage) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (station_id, mac, _epoch(start_time), sensor_version, battery_voltage),
+            )
+            return cursor.lastrowid
+
+    def addSample(
+        self,
+        run_id: int,
+        time: Timestamp,
+        elapsed: float,
+        pressure: float,
+        pressure_std: float,
+        average_rate: float = None,
+        rate_error: float = None,
+        fit_rate: float = None,
+        fit_rate_error: float = None,
+    ):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, _epoch(time), elapsed, pressure, pressure_std,
+                 average_rate, rate_error, fit_rate, fit_rate_error),
+            )
+
+    def finishRun(
+        self,
+        run_id: int,
+        end_time: Timestamp,
+        stop_reason: str = None,
+        fit_rate: float = None,
+        fit_rate_error: float = None,
+        error: str = None,
+    ):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET end_time = ?, stop_reason = ?, fit_rate = ?, fit_rate_error = ?, error = ? "
+                "WHERE id = ?",
+                (_epoch(end_time), stop_reason, fit_rate, fit_rate_error, error, run_id),
+            )
+
+    # ---- Queries ----
+
+    def runs(
+        self,
+        mac: str = None,
+        station: str = None,
+        since: Timestamp = None,
+        until: Timestamp = None,
+        min_rate: float = None,
+        max_rate: float = None,
+    ) -> List[sqlite3.Row]:
+        """Returns runs matching every given filter, newest first
+        Args:       mac: unit MAC address
+                    station: flasher serial of the station
+                    since / until: start time bounds, epoch seconds or datetime
+                    min_rate / max_rate: bounds on the fitted leak rate in kPa/hr"""
+        conditions = []
+        parameters = []
+        for clause, value in (
+            ("runs.mac = ?", mac),
+            ("stations.flasher_serial = ?", station),
+            ("runs.start_time >= ?", None if since is None else _epoch(since)),
+            ("runs.start_time < ?", None if until is None else _epoch(until)),
+            ("runs.fit_rate > ?", min_rate),
+            ("runs.fit_rate < ?", max_rate),
+        ):
+            if value is not None:
+                conditions.append(clause)
+                parameters.append(value)
+        query = (
+            "SELECT runs.*, stations.flasher_serial, stations.label FROM runs "
+            "JOIN stations ON stations.id = runs.station_id"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY runs.start_time DESC"
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def samples(self, run_id: int) -> List[sqlite3.Row]:
+        """Returns every sample of a run in time order"""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT * FROM samples WHERE run_id = ? ORDER BY time", (run_id,)
+            ).fetchall()
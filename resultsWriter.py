@@ -0,0 +1,160 @@
+"""Buffered results CSV writer
+
+One CsvResultsWriter is kept open for a whole decay run instead of
+reopening the file for every sample. Rows are flushed to the OS at most
+flush_interval seconds after they are written, so they survive a crash of
+this program, and the file is fsynced at most checkpoint_interval seconds
+after a flush so they also survive a power loss.
+
+Both bounds hold without further writes: a station sampling every few
+minutes leaves its last row in the buffer, so every writer with unflushed
+or unsynced rows has a deadline, and one daemon thread shared by all
+writers flushes or checkpoints each writer when its deadline passes."""
+
+import csv
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import List
+
+
+class CsvResultsWriter:
+    def __init__(
+        self,
+        path: str,
+        header: List[str],
+        flush_interval: float = 10.0,
+        checkpoint_interval: float = 600.0,
+    ) -> None:
+        """Opens path for appending, writes header if the file is new
+        Args:       path: CSV file path
+                    header: column names
+                    flush_interval: max seconds a written row stays in the buffer
+                    checkpoint_interval: max seconds between fsyncs"""
+        self.path = path
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        self._pending_rows = 0
+        self._unsynced = False
+        self._deadline: float = None
+        self._last_flush = time.monotonic()
+        self._last_checkpoint = self._last_flush
+        if new_file:
+            with self._lock:
+                self._writer.writerow(header)
+                self._pending_rows += 1
+                self._unsynced = True
+                self._flushIfDue(time.monotonic())
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def writerow(self, row: list):
+        """Buffers one row, flushes or checkpoints if their interval has passed"""
+        with self._lock:
+            self._writer.writerow(row)
+            self._pending_rows += 1
+            self._unsynced = True
+            self._flushIfDue(time.monotonic())
+
+    def flushIfDue(self):
+        """Flushes or checkpoints if their interval has passed, called by the deadline thread"""
+        with self._lock:
+            self._deadline = None
+            if not self._file.closed:
+                self._flushIfDue(time.monotonic())
+
+    def flush(self):
+        """Hands buffered rows to the OS"""
+        with self._lock:
+            self._flush()
+
+    def checkpoint(self):
+        """Flushes and fsyncs so every row written so far is on disk"""
+        with self._lock:
+            self._checkpoint()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._checkpoint()
+            self._file.close()
+
+    def _flushIfDue(self, now: float):
+        if self._unsynced and now - self._last_checkpoint >= self.checkpoint_interval:
+            self._checkpoint()
+        elif self._pending_rows and now - self._last_flush >= self.flush_interval:
+            self._flush()
+        # the next write may be minutes away, the deadline thread takes over until then
+        if self._pending_rows:
+            self._schedule(self._last_flush + self.flush_interval)
+        elif self._unsynced:
+            self._schedule(self._last_checkpoint + self.checkpoint_interval)
+
+    def _schedule(self, deadline: float):
+        if self._deadline is not None and self._deadline <= deadline:
+            return
+        self._deadline = deadline
+        _DEADLINES.schedule(deadline, self)
+
+    def _flush(self):
+        if self._pending_rows:
+            self._file.flush()
+            self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+    def _checkpoint(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending_rows = 0
+        self._unsynced = False
+        self._last_flush = self._last_checkpoint = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _DeadlineThread:
+    """Calls flushIfDue of writers once their deadline on time.monotonic() has passed, from one daemon thread"""
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._heap = list()
+        self._order = itertools.count()  # writers themselves don't compare
+        self._thread: threading.Thread = None
+
+    def schedule(self, deadline: float, writer: CsvResultsWriter):
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._order), writer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="results-flush", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, writer = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            writer.flushIfDue()
+
+
+_DEADLINES = _DeadlineThread()
@@ -0,0 +1,73 @@
+"""Acceptance limits per pressure sensor version
+
+PRESSURE_SENSOR_LIMITS maps a PressureSensorVersionEnum value to the limits a
+raw sample window from that sensor has to meet. checkWindow applies them to
+every sample of a window at once, so a bad sensor fails on its first window."""
+
+import pyoto.otoProtocol.otoMessageDefs as otoMessageDefs
+
+import lazyImport
+import pressureStats
+
+np = lazyImport.lazyModule("numpy")
+
+
+class SensorLimits:
+    """Limits for one pressure sensor version, ADC values in raw counts
+    Args:       gauge_range: full scale of the sensor in kPa
+                max_acceptable_STD / min_acceptable_STD: bounds on the window STD
+                max_acceptable_ADC / min_acceptable_ADC: bounds on every sample"""
+
+    def __init__(
+        self,
+        gauge_range: float,
+        max_acceptable_STD: float,
+        min_acceptable_STD: float,
+        max_acceptable_ADC: float,
+        min_acceptable_ADC: float,
+    ) -> None:
+        self.gauge_range = gauge_range
+        self.max_acceptable_STD = max_acceptable_STD
+        self.min_acceptable_STD = min_acceptable_STD
+        self.max_acceptable_ADC = max_acceptable_ADC
+        self.min_acceptable_ADC = min_acceptable_ADC
+
+
+PRESSURE_SENSOR_LIMITS = {
+    otoMessageDefs.PressureSensorVersionEnum.MPRL_30_PSI_GAUGE.value: SensorLimits(
+        gauge_range=206.8427,  # 206.8427 kPa = 30 psi
+        max_acceptable_STD=206.9,  # Jan 2023 ±4σ
+        min_acceptable_STD=66.5,  # Jan 2023 ±4σ
+        # The Jan 2023 ±4σ band of 1630925 to 1764145 is the zero offset, its upper end
+        # only holds for an unpressurized unit, so samples are capped at full scale instead
+        max_acceptable_ADC=0.9 * (2**24),
+        min_acceptable_ADC=1630925,  # Jan 2023 ±4σ
+    ),
+}
+
+# Sensors of old design boards, these cannot be tested on this station
+OLD_DESIGN_SENSOR_VERSIONS = {
+    otoMessageDefs.PressureSensorVersionEnum.TPBD_15_PSI_GAUGE.value,
+    otoMessageDefs.PressureSensorVersionEnum.MPRL_15_PSI_GAUGE.value,
+}
+
+
+def checkWindow(limits: SensorLimits, window: pressureStats.PressureWindow):
+    """Checks every sample of window and its STD against limits
+    Returns:    None if the window is within limits, error string otherwise"""
+    values = window.values
+    out_of_range = np.count_nonzero(
+        (values < limits.min_acceptable_ADC) | (values > limits.max_acceptable_ADC)
+    )
+    if out_of_range:
+        return (
+            f"{out_of_range} of {window.count} pressure readings outside "
+            f"{limits.min_acceptable_ADC:.0f} to {limits.max_acceptable_ADC:.0f} ADC\n压力数值超出范围"
+        )
+    std = window.std
+    if not limits.min_acceptable_STD <= std <= limits.max_acceptable_STD:
+        return (
+            f"Pressure STD {std:.1f} ADC outside {limits.min_acceptable_STD} to "
+            f"{limits.max_acceptable_STD} ADC\n压力波动超出范围"
+        )
+    return None
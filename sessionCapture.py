@@ -0,0 +1,250 @@
+"""Capture and replay of OtO device sessions
+
+RecordingOtoInterface wraps a pyoto.OtoInterface (or the simulator) and
+writes everything a DecayStation receives from it to a JSON lines file:
+connect results, MAC, voltages, sensor version and the pressure packets of
+every sample window. ReplayOtoInterface plays such a file back in place of
+a device, so a recorded production run can go through the full analysis
+path without hardware, see replaySessions.py.
+
+File layout, one JSON object per line:
+    header: {"format": FORMAT, "version": VERSION, ...test settings of the run}
+    reply:  {"call": name, "reply": {field: value}} or {"call": name, "error": repr}
+    window: {"call": "window", "time": start, "pressure_adc": [...], "timestamp": [...]}"""
+
+import collections
+import json
+import os
+from types import SimpleNamespace
+
+import otoSimulator
+
+FORMAT = "decay-session"
+VERSION = 1
+# Reply fields kept of each request / response command
+REPLY_FIELDS = {
+    "get_mac_address": ("string",),
+    "get_voltages": ("battery_voltage_v",),
+    "get_pressure_sensor_version": ("pressure_sensor_version",),
+}
+
+
+class ReplayError(Exception):
+    """Raised on replay of a call that failed while recording, or that is missing from the capture"""
+
+
+class RecordingOtoInterface:
+    """Passes every call through to interface and records its replies to path"""
+
+    def __init__(self, interface, path: str, header: dict = None) -> None:
+        """Args:       interface: device interface to record
+                    path: capture file, created or appended to
+                    header: test settings stored with the capture"""
+        self.interface = interface
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a")
+        self._subscribed = False
+        self._windowTime = None
+        self._windowADC = []
+        self._windowTimestamps = []
+        self._write({"format": FORMAT, "version": VERSION, **(header or {})})
+
+    def __getattr__(self, name):
+        # commands without a reply the analysis depends on
+        return getattr(self.interface, name)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _recordCall(self, name: str, *args, **kwargs):
+        try:
+            reply = getattr(self.interface, name)(*args, **kwargs)
+        except Exception as error:
+            self._recordError(name, error)
+            raise
+        self._recordReply(name, reply)
+        return reply
+
+    def _recordReply(self, name: str, reply):
+        fields = REPLY_FIELDS.get(name, ())
+        self._write({"call": name, "reply": {field: getattr(reply, field) for field in fields}})
+
+    def _recordError(self, name: str, error: Exception):
+        self._write({"call": name, "error": repr(error)})
+        self._file.flush()
+
+    def start_connection(self, *args, **kwargs):
+        return self._recordCall("start_connection", *args, **kwargs)
+
+    def start_connection_steps(self, *args, **kwargs):
+        """Generator of start_connection, recorded when it ends, blocking if the interface has no steps"""
+        steps = getattr(self.interface, "start_connection_steps", None)
+        try:
+            if steps is None:
+                reply = self.interface.start_connection(*args, **kwargs)
+            else:
+                reply = yield from steps(*args, **kwargs)
+        except Exception as error:
+            self._recordError("start_connection", error)
+            raise
+        self._recordReply("start_connection", reply)
+        return reply
+
+    def get_mac_address(self):
+        return self._recordCall("get_mac_address")
+
+    def get_voltages(self):
+        return self._recordCall("get_voltages")
+
+    def get_pressure_sensor_version(self):
+        return self._recordCall("get_pressure_sensor_version")
+
+    def set_sensor_subscribe(self, subscribe_frequency=None):
+        reply = self.interface.set_sensor_subscribe(subscribe_frequency=subscribe_frequency)
+        if self._subscribed:
+            self._writeWindow()
+        self._subscribed = otoSimulator.subscribeFrequencyHz(subscribe_frequency) > 0
+        return reply
+
+    def clear_incoming_packet_log(self):
+        self.interface.clear_incoming_packet_log()
+        if self._subscribed:
+            # packets of a window are the ones read after the last clear
+            self._windowADC.clear()
+            self._windowTimestamps.clear()
+            self._windowTime = None
+
+    def read_all_sensor_packets(self, limit: int = None, consume: bool = True):
+        packets = self.interface.read_all_sensor_packets(limit=limit, consume=consume)
+        if consume and self._subscribed:
+            if self._windowTime is None and packets:
+                self._windowTime = getattr(packets[0], "timestamp", None)
+            for packet in packets:
+                self._windowADC.append(packet.pressure_adc)
+                self._windowTimestamps.append(getattr(packet, "timestamp", None))
+        return packets
+
+    def _writeWindow(self):
+        self._write({
+            "call": "window",
+            "time": self._windowTime,
+            "pressure_adc": self._windowADC,
+            "timestamp": self._windowTimestamps,
+        })
+        self._file.flush()
+        self._windowADC = []
+        self._windowTimestamps = []
+        self._windowTime = None
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._subscribed:
+            self._writeWindow()
+            self._subscribed = False
+        self._file.close()
+
+
+def readCapture(path: str):
+    """Reads a capture file
+    Returns:    (header, records)
+    Raises:     ValueError if path is not a session capture"""
+    with open(path) as file_handler:
+        lines = [line for line in file_handler if line.strip()]
+    if not lines:
+        raise ValueError(f"{path} is empty")
+    header = json.loads(lines[0])
+    if header.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a session capture")
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            break  # truncated last line of a crashed run
+    return header, records
+
+
+class ReplayOtoInterface:
+    """Drop-in replacement for pyoto.OtoInterface that plays back a capture
+
+    Replies come back in recorded order, each subscription delivers the next
+    recorded window at once, so a replay runs as fast as the analysis allows."""
+
+    def __init__(self, path: str, clock=None, logger=None) -> None:
+        self.path = path
+        self.clock = clock
+        self.logger = logger
+        self.header, records = readCapture(path)
+        self._replies = collections.defaultdict(collections.deque)
+        self._windows = collections.deque()
+        for record in records:
+            if record["call"] == "window":
+                self._windows.append(record)
+            else:
+                self._replies[record["call"]].append(record)
+        self._packet_log = []
+        self._windowPending = False
+        self.samplesReplayed = 0
+
+    def _reply(self, name: str):
+        if not self._replies[name]:
+            raise ReplayError(f"{name} is not in capture {self.path}")
+        record = self._replies[name].popleft()
+        if "error" in record:
+            raise ReplayError(record["error"])
+        return SimpleNamespace(**record["reply"])
+
+    def start_connection(self, port: str = None, device_id: str = None, reset_on_connect: bool = True):
+        # captures of a reused connection have no start_connection
+        if self._replies["start_connection"]:
+            self._reply("start_connection")
+
+    def end_connection(self):
+        self._packet_log.clear()
+
+    def get_mac_address(self):
+        return self._reply("get_mac_address")
+
+    def get_voltages(self):
+        return self._reply("get_voltages")
+
+    def get_pressure_sensor_version(self):
+        return self._reply("get_pressure_sensor_version")
+
+    def use_moving_average_filter(self, enable: bool):
+        pass
+
+    def set_valve_duty(self, direction: int = 0, duty_cycle: float = 0):
+        pass
+
+    def set_nozzle_duty(self, direction: int = 0, duty_cycle: float = 0):
+        pass
+
+    def set_sensor_subscribe(self, subscribe_frequency=None):
+        self._packet_log.clear()
+        self._windowPending = False
+        if otoSimulator.subscribeFrequencyHz(subscribe_frequency) > 0 and self._windows:
+            window = self._windows.popleft()
+            self._packet_log = [
+                otoSimulator.SimulatedSensorReadMessage(adc, timestamp)
+                for adc, timestamp in zip(window["pressure_adc"], window["timestamp"])
+            ]
+            self._windowPending = True
+
+    def clear_incoming_packet_log(self):
+        # the first clear after subscribing starts the recorded window
+        if self._windowPending:
+            self._windowPending = False
+        else:
+            self._packet_log.clear()
+
+    def read_all_sensor_packets(self, limit: int = None, consume: bool = True):
+        packets = self._packet_log[:limit]
+        if consume:
+            del self._packet_log[: len(packets)]
+            self.samplesReplayed += len(packets)
+        return packets
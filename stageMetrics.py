@@ -0,0 +1,111 @@
+"""Per-stage timing histograms of the decay test
+
+Every DecayStation times its stages (port lookup, connect, bring-up,
+subscribe/settle, sample collection, results writes) into one StageMetrics
+shared by all stations. The histograms are written as a Prometheus text
+file, e.g. for the node_exporter textfile collector, so a slow fixture can
+be told apart: stuck on the USB bus, in reboot, or in our own processing.
+
+Times are wall clock seconds, also when the test loop runs on a virtual clock."""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+METRIC_NAME = "decay_stage_duration_seconds"
+# Upper bounds in seconds, from a fast CSV write up to a slow reboot
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulativeCounts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class StageMetrics:
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = dict()
+        self._lastWrite = 0.0
+
+    def observe(self, station: str, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((station, stage))
+            if histogram is None:
+                histogram = self._histograms[(station, stage)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, station: str, stage: str):
+        """Times the body of a with block as one observation of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(station, stage, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Returns {station: {stage: {"count", "sum", "buckets": {le: cumulative count}}}}"""
+        result = dict()
+        with self._lock:
+            for (station, stage), histogram in self._histograms.items():
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                result.setdefault(station, dict())[stage] = {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip(bounds, histogram.cumulativeCounts())),
+                }
+        return result
+
+    def prometheusText(self) -> str:
+        lines = [
+            f"# HELP {METRIC_NAME} Wall clock time spent in each decay test stage",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for station, stages in sorted(self.snapshot().items()):
+            for stage, histogram in sorted(stages.items()):
+                labels = f'station="{_escape(station)}",stage="{stage}"'
+                for bound, count in histogram["buckets"].items():
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram['sum']:.6f}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Writes the Prometheus text file, replaced atomically so a scraper never reads half a file"""
+        text = self.prometheusText()
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file_handler:
+            file_handler.write(text)
+        os.replace(temporary, path)
+
+    def writeIfDue(self, path: str, interval: float):
+        """Writes the file if interval seconds have passed since the last write"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._lastWrite < interval:
+                return
+            self._lastWrite = now
+        self.write(path)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,47 @@
+"""Startup time of the process up to the first connect
+
+The entry scripts import this module before anything else, so its import
+time stands in for the launch of the process. mark() records the end of a
+named startup stage, and reportReady() logs the time from launch to the
+point where stations can connect, with the stages, and warns when it is
+over the budget (decayEngine.STARTUP_BUDGET)."""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+_start = time.perf_counter()
+_lock = threading.Lock()
+_marks = list()
+_reported = False
+
+
+def mark(stage: str):
+    """Records the end of a startup stage"""
+    with _lock:
+        _marks.append((stage, elapsed()))
+
+
+def elapsed() -> float:
+    """Seconds since the first import of this module"""
+    return time.perf_counter() - _start
+
+
+def reportReady(logger: logging.Logger, budget: float = None) -> Optional[float]:
+    """Logs the startup time once the process is ready to connect, as a warning if it is over budget
+    Returns:    seconds since launch on the first call, None after"""
+    global _reported
+    with _lock:
+        if _reported:
+            return None
+        _reported = True
+        seconds = elapsed()
+        marks = list(_marks)
+    stages = ", ".join(f"{stage} at {at:.3f} s" for stage, at in marks)
+    message = f"Ready to connect {seconds:.3f} s after launch" + (f" ({stages})" if stages else "")
+    if budget is not None and seconds > budget:
+        logger.warning(f"{message}, over the {budget} s startup budget  启动超时")
+    else:
+        logger.info(message)
+    return seconds
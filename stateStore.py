@@ -0,0 +1,56 @@
+"""Coalescing store of station status changes for the GUI
+
+Test threads report status changes with update(), which only records the
+latest status per station under a lock. The Tk thread calls drain() once
+per frame and repaints just the stations that changed since the last
+frame, however many changes happened in between. A running count of
+stations in a busy status makes "is any station busy" O(1). The latest
+sample of each station is coalesced the same way with updateSample() and
+drainSamples()."""
+
+import threading
+from typing import Dict, Hashable, Iterable
+
+
+class StationStateStore:
+    def __init__(self, busy_states: Iterable) -> None:
+        """Args:       busy_states: statuses counted as busy"""
+        self.busyStates = frozenset(busy_states)
+        self._lock = threading.Lock()
+        self._statuses: Dict[Hashable, object] = dict()
+        self._changed: Dict[Hashable, object] = dict()
+        self._samples: Dict[Hashable, object] = dict()
+        self._busyCount = 0
+
+    def update(self, key: Hashable, status):
+        """Records the new status of the station key, safe from any thread"""
+        with self._lock:
+            previous = self._statuses.get(key)
+            self._busyCount += (status in self.busyStates) - (previous in self.busyStates)
+            self._statuses[key] = status
+            self._changed[key] = status
+
+    def drain(self) -> Dict[Hashable, object]:
+        """Returns {key: latest status} of every station changed since the last drain"""
+        with self._lock:
+            changed, self._changed = self._changed, dict()
+        return changed
+
+    def updateSample(self, key: Hashable, sample):
+        """Records the latest sample of the station key, safe from any thread"""
+        with self._lock:
+            self._samples[key] = sample
+
+    def drainSamples(self) -> Dict[Hashable, object]:
+        """Returns {key: latest sample} of every station with a new sample since the last drain"""
+        with self._lock:
+            samples, self._samples = self._samples, dict()
+        return samples
+
+    def status(self, key: Hashable):
+        with self._lock:
+            return self._statuses.get(key)
+
+    @property
+    def busyCount(self) -> int:
+        return self._busyCount
@@ -0,0 +1,350 @@
+"""Stations sharded across worker processes
+
+A StationSupervisor splits the flasher boards into shards, one per worker
+process. Each worker owns its boards' DecayStations and runs them with its
+own TestOrchestrator, so acquisition, parsing and statistics of different
+shards run on different cores instead of sharing the GUI's interpreter.
+
+The GUI process only gets compact records over one pipe per worker:
+    ("status", index, status name)          on every station status change
+    ("log", index, level, message)          for every station log record
+    ("sample", index, time, pressure, rate) after a station's sample, at most every
+                                            SAMPLE_RECORD_INTERVAL per station and always the last
+    ("done", index, result)                 when a station's test ends in a batch run
+    ("finished",)                           when the worker's batch or continuous run ends
+index is the station's position in the supervisor's serial list, pressure
+is in kPa and rate is the fitted leak rate in kPa/hr. The sample windows
+stay in the worker, which writes them to the CSV files, results database
+and raw archives itself. Commands go the other way: ("run",),
+("continuous",), ("stop",) and ("quit",).
+
+Worker processes are started with the spawn method on every platform.
+Spawn re-imports the parent's main script in every worker as __mp_main__,
+so workers started from DecayOverall.py also import tkinter and run its
+module level setup, though they never create a window. Workers started
+from decayTest.py import only the Tk-free engine modules."""
+
+import logging
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Set
+
+import decayEngine
+import decayTest
+import resultsStore
+import startupBudget
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RECORD_INTERVAL = 0.5  # min wall clock seconds between sample records of one station, for fast clocks
+
+
+class StationSupervisor:
+    def __init__(
+        self,
+        flasher_serials: List[str],
+        labels: List[str] = None,
+        processes: int = None,
+        io_workers: int = 20,
+        on_status: Callable = None,
+        on_log: Callable = None,
+        on_sample: Callable = None,
+        on_finished: Callable = None,
+        settings: dict = None,
+    ) -> None:
+        """Args:       flasher_serials: USB serials of the flasher boards, in station order
+                    labels: station names, the serials if None
+                    processes: number of worker processes, one per core if None, never more than the boards
+                    io_workers: serial I/O threads in each worker
+                    on_status: called with (index, StationStatus) on every status change, from the reader thread
+                    on_log: called with (index, logging.LogRecord) for every station log record, from the reader thread
+                    on_sample: called with (index, time, pressure in kPa, fit rate in kPa/hr) for every sample
+                        record, from the reader thread
+                    on_finished: called with the list of results, None on success, error string otherwise,
+                        when a run has ended on every worker, from the reader thread
+                    settings: decayEngine settings to set in the workers, {name: value}, for values changed at run time"""
+        self.serials = list(flasher_serials)
+        self.labels = list(labels) if labels is not None else list(self.serials)
+        processes = processes if processes else os.cpu_count() or 1
+        self.processes = max(1, min(processes, len(self.serials)))
+        self.io_workers = io_workers
+        self.onStatus = on_status
+        self.onLog = on_log
+        self.onSample = on_sample
+        self.onFinished = on_finished
+        self.settings = dict(settings) if settings else dict()
+        self.results: List = [None] * len(self.serials)
+        self._workers: List[multiprocessing.Process] = list()
+        self._connections: List[multiprocessing.connection.Connection] = list()
+        self._lock = threading.Lock()
+        self._shards: Dict[multiprocessing.connection.Connection, List[int]] = dict()
+        self._alive: Set[multiprocessing.connection.Connection] = set()
+        self._running: Set[multiprocessing.connection.Connection] = set()
+        self._reported: Set[int] = set()
+        self._closing = False
+        self._reader: threading.Thread = None
+
+    def shards(self) -> List[List[int]]:
+        """Returns the station indexes of every worker, contiguous blocks of about equal size"""
+        size = math.ceil(len(self.serials) / self.processes)
+        return [list(range(start, min(start + size, len(self.serials)))) for start in range(0, len(self.serials), size)]
+
+    def start(self):
+        """Starts the worker processes and the thread reading their records"""
+        context = multiprocessing.get_context("spawn")
+        shards = self.shards()
+        # every worker staggers its own shard, a share of the cap keeps the total near MAX_CONCURRENT_WINDOWS
+        maxWindows = max(1, math.ceil(decayEngine.MAX_CONCURRENT_WINDOWS / len(shards)))
+        for shardIndex, indexes in enumerate(shards):
+            parentConnection, childConnection = context.Pipe()
+            worker = context.Process(
+                target=workerMain,
+                args=(
+                    childConnection,
+                    shardIndex,
+                    indexes,
+                    [self.serials[index] for index in indexes],
+                    [self.labels[index] for index in indexes],
+                    self.io_workers,
+                    maxWindows,
+                    self.settings,
+                ),
+                name=f"decay-worker-{shardIndex}",
+                daemon=True,
+            )
+            worker.start()
+            childConnection.close()
+            self._workers.append(worker)
+            self._connections.append(parentConnection)
+            self._shards[parentConnection] = indexes
+            self._alive.add(parentConnection)
+        self._reader = threading.Thread(target=self._read, name="decay-supervisor", daemon=True)
+        self._reader.start()
+        return self
+
+    def runAll(self):
+        """Starts a batch run on every worker, on_finished is called when all are done"""
+        with self._lock:
+            self.results = [None] * len(self.serials)
+            self._reported.clear()
+        self._send(("run",))
+
+    def runContinuous(self):
+        """Starts continuous testing on every worker until stopContinuous"""
+        self._send(("continuous",))
+
+    def stopContinuous(self):
+        """Ends continuous testing, running tests are finished first"""
+        with self._lock:
+            alive = list(self._alive)
+        for connection in alive:
+            try:
+                connection.send(("stop",))
+            except OSError:
+                pass  # the reader thread handles the exited worker
+
+    def close(self, timeout: float = 5.0):
+        """Asks the workers to quit and waits up to timeout for each"""
+        self._closing = True
+        for connection in self._connections:
+            try:
+                connection.send(("quit",))
+            except OSError:
+                pass  # worker already gone
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers.clear()
+
+    def _send(self, command: tuple):
+        """Sends command to every worker, each counts as running until it reports finished or exits"""
+        with self._lock:
+            self._running = set(self._connections)
+            alive = set(self._alive)
+        for connection in self._connections:
+            if connection not in alive:
+                self._workerExited(connection)
+                continue
+            try:
+                connection.send(command)
+            except OSError:
+                self._workerExited(connection)
+
+    def _read(self):
+        connections = list(self._connections)
+        while connections:
+            for connection in multiprocessing.connection.wait(connections):
+                try:
+                    record = connection.recv()
+                except (EOFError, OSError):
+                    connections.remove(connection)
+                    self._workerExited(connection)
+                    continue
+                try:
+                    self._dispatch(connection, record)
+                except Exception:
+                    logger.exception(f"Failed to handle worker record {record!r}")
+
+    def _workerExited(self, connection):
+        """Fails the stations of an exited worker that didn't report a result and ends its part of the run"""
+        with self._lock:
+            firstNotice = connection in self._alive
+            self._alive.discard(connection)
+            wasRunning = connection in self._running
+            failed = [index for index in self._shards[connection] if index not in self._reported]
+        if self._closing:
+            return
+        if firstNotice:
+            shard = self._shards[connection]
+            logger.error(f"Station worker of stations {shard[0] + 1} to {shard[-1] + 1} exited")
+        if not wasRunning:
+            return
+        for index in failed:
+            self.results[index] = "Station worker process exited\n测试进程退出"
+            if self.onStatus is not None:
+                self.onStatus(index, decayEngine.StationStatus.FAIL)
+        self._workerFinished(connection)
+
+    def _workerFinished(self, connection):
+        """Ends the run of one worker, calls on_finished when it was the last one running"""
+        with self._lock:
+            if connection not in self._running:
+                return
+            self._running.discard(connection)
+            if self._running:
+                return
+        if self.onFinished is not None:
+            self.onFinished(list(self.results))
+
+    def _dispatch(self, connection, record: tuple):
+        kind = record[0]
+        if kind == "status":
+            if self.onStatus is not None:
+                self.onStatus(record[1], decayEngine.StationStatus[record[2]])
+        elif kind == "log":
+            if self.onLog is not None:
+                _, index, level, message = record
+                self.onLog(index, logging.makeLogRecord(
+                    {"name": self.serials[index], "levelno": level, "levelname": logging.getLevelName(level), "msg": message}
+                ))
+        elif kind == "sample":
+            if self.onSample is not None:
+                self.onSample(*record[1:])
+        elif kind == "done":
+            with self._lock:
+                self.results[record[1]] = record[2]
+                self._reported.add(record[1])
+        elif kind == "finished":
+            self._workerFinished(connection)
+
+
+class PipeLogHandler(logging.Handler):
+    """Sends the log records of one station to the supervisor as ("log", index, level, message)"""
+
+    def __init__(self, send: Callable, index: int):
+        super().__init__()
+        self.send = send
+        self.index = index
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.send(("log", self.index, record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def workerMain(
+    connection,
+    shard: int,
+    indexes: List[int],
+    serials: List[str],
+    labels: List[str],
+    io_workers: int,
+    max_windows: int,
+    settings: dict,
+):
+    """Runs in a worker process: owns the stations of one shard until told to quit"""
+    for name, value in settings.items():
+        setattr(decayEngine, name, value)
+    sendLock = threading.Lock()
+
+    def send(record: tuple):
+        with sendLock:
+            connection.send(record)
+
+    if decayEngine.METRICS_PATH:
+        # one metrics file per worker, a textfile collector reads them all
+        root, ext = os.path.splitext(decayEngine.METRICS_PATH)
+        decayEngine.METRICS_PATH = f"{root}-{shard}{ext}"
+    store = resultsStore.ResultsStore(decayEngine.RESULTS_DB_PATH) if decayEngine.RESULTS_DB_PATH else None
+    lastSampleRecord = dict()
+
+    def sendSample(index: int, station: decayEngine.DecayStation, sampleTime: float, pressure: float, rate: float):
+        # accelerated clocks sample far faster than the GUI can show, the last sample of a test always goes
+        now = time.monotonic()
+        if not station.testComplete and now - lastSampleRecord.get(index, -SAMPLE_RECORD_INTERVAL) < SAMPLE_RECORD_INTERVAL:
+            return
+        lastSampleRecord[index] = now
+        send(("sample", index, sampleTime, pressure, rate))
+
+    stations = list()
+    for index, serial, label in zip(indexes, serials, labels):
+        stationLogger = logging.getLogger(serial)
+        stationLogger.setLevel(logging.INFO)
+        stationLogger.propagate = False
+        stationLogger.addHandler(PipeLogHandler(send, index))
+        stations.append(decayEngine.DecayStation(
+            serial,
+            label=label,
+            results_store=store,
+            on_status=lambda station, status, index=index: send(("status", index, status.name)),
+            on_sample=lambda station, *sample, index=index: sendSample(index, station, *sample),
+        ))
+
+    def runAll():
+        for index, station, result in zip(indexes, stations, decayTest.makeOrchestrator(io_workers, max_windows).run(stations)):
+            if result is None:
+                station.status = decayEngine.StationStatus.SUCCESS
+            send(("done", index, result))
+        send(("finished",))
+
+    def runContinuous(stop: threading.Event):
+        decayTest.makeOrchestrator(io_workers, max_windows).runContinuous(stations, stop, poll_interval=decayEngine.UNIT_POLL_INTERVAL)
+        send(("finished",))
+
+    startupBudget.reportReady(logging.getLogger(serials[0]), decayEngine.STARTUP_BUDGET)
+
+    runner: threading.Thread = None
+    stop = threading.Event()
+    try:
+        while True:
+            try:
+                command = connection.recv()[0]
+            except EOFError:
+                break  # the GUI process is gone
+            if command == "quit":
+                break
+            if command == "stop":
+                stop.set()
+            elif runner is not None and runner.is_alive():
+                logger.warning(f"Worker {shard} is busy, ignoring {command}")
+            elif command == "run":
+                runner = threading.Thread(target=runAll, name="decay-run")
+                runner.start()
+            elif command == "continuous":
+                stop = threading.Event()
+                runner = threading.Thread(target=runContinuous, args=(stop,), name="decay-run")
+                runner.start()
+    finally:
+        stop.set()
+        if runner is not None:
+            runner.join()
+        decayEngine.CONNECTION_CACHE.closeAll()
+        if store is not None:
+            store.close()
+        connection.close()
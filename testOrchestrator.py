@@ -0,0 +1,140 @@
+"""asyncio orchestrator for running decay tests on many stations at once
+
+Every station runs as a lightweight task that waits on its clock between
+samples, so a station never needs a thread of its own. Only the blocking
+serial calls (port lookup, connect, bring-up, the commands of a pressure
+check) are handed to a thread pool of io_workers threads shared by all
+stations; the reboot, settle and sample window waits between them are
+awaited on the station's clock, so a rebooting board or a 3 second window
+holds no thread. An interface that can't hand out its reboot wait, like
+pyoto's OtoInterface, holds a thread for its whole start_connection.
+
+A station is any object with the DecayStation test steps:
+    startSteps() -> generator of the seconds to wait between the serial
+        calls of the connect, returning error or None
+    nextSampleDelay() -> seconds
+    sampleSteps() -> generator of the seconds to wait between the serial
+        calls of one sample, returning error or None
+    testComplete, clock and logger attributes
+
+runContinuous keeps every station testing on its own until stopped: a
+station starts as soon as a new unit is seated on its fixture, which also
+needs checkForNewUnit() -> bool and finishUnit(error).
+
+With an AcquisitionScheduler, every sample is taken inside a scheduler
+window, which caps the stations acquiring at once and records their
+scheduling lag. In a batch run, where all stations start together, each
+station also gets a deterministic sampleOffset from its index before it
+starts. Continuous runs start every unit whenever it is seated, so a slot
+by index aligns nothing there; their offset is 0 and the cap alone spreads
+the windows."""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import List
+
+import acquisitionScheduler
+
+
+class TestOrchestrator:
+    def __init__(self, io_workers: int = 20, scheduler: acquisitionScheduler.AcquisitionScheduler = None) -> None:
+        """Args:       io_workers: number of serial I/O threads shared by the stations
+                    scheduler: places the sample windows of the stations, None to sample every station freely"""
+        self.io_workers = io_workers
+        self.scheduler = scheduler
+        self._executor: concurrent.futures.ThreadPoolExecutor = None
+
+    def run(self, stations: list) -> List:
+        """Runs the decay test on all stations concurrently and blocks until all are done
+        Args:       stations: list of stations
+        Returns:    list with one result per station, None on success, error string otherwise"""
+        return asyncio.run(self.runAll(stations))
+
+    def runContinuous(self, stations: list, stop: threading.Event, poll_interval: float = 2.0):
+        """Tests every newly seated unit on each station until stop is set, blocks until then
+        Args:       stations: list of stations
+                    stop: set from any thread to end, running tests are finished first
+                    poll_interval: seconds between checks for a new unit on an idle station"""
+        asyncio.run(self.runAll(stations, lambda station: self.runStationContinuous(station, stop, poll_interval)))
+
+    async def runAll(self, stations: list, runner=None) -> List:
+        """Runs runner on every station, a batch run of runStation if None"""
+        batch = runner is None
+        runner = runner if runner is not None else self.runStation
+        for index, station in enumerate(stations):
+            station.sampleOffset = self.scheduler.offset(index) if batch and self.scheduler is not None else 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="serial-io") as executor:
+            self._executor = executor
+            results = await asyncio.gather(*(runner(station) for station in stations))
+        if self.scheduler is not None:
+            self.logLag(stations)
+        return results
+
+    def logLag(self, stations: list):
+        """Logs the scheduling lag of every station that took a sample"""
+        report = self.scheduler.lagReport()
+        for station in stations:
+            lag = report.get(acquisitionScheduler.stationKey(station))
+            if lag is not None:
+                station.logger.info(
+                    f"Scheduling lag: mean {lag['mean']:.3f} s, max {lag['max']:.3f} s over {lag['count']} samples"
+                )
+
+    async def io(self, fn, *args):
+        """Runs a blocking call on the serial I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def runSteps(self, station, steps):
+        """Runs a generator of steps such as sampleSteps: each blocking step on the I/O pool,
+        each wait it yields on the station's clock
+        Returns:    value returned by the generator"""
+        while True:
+            finished, value = await self.io(_advance, steps)
+            if finished:
+                return value
+            await station.clock.asleep(value)
+
+    async def sample(self, station):
+        """Takes the station's next sample, in a scheduler window if there is a scheduler"""
+        if self.scheduler is None:
+            return await self.runSteps(station, station.sampleSteps())
+        async with self.scheduler.window(station):
+            return await self.runSteps(station, station.sampleSteps())
+
+    async def runStation(self, station):
+        """Runs one station's decay test, mirrors SerialBoardCard.ButtonCallback"""
+        try:
+            error = await self.runSteps(station, station.startSteps())
+            while error is None and not station.testComplete:
+                await station.clock.asleep(station.nextSampleDelay())
+                error = await self.sample(station)
+            return error
+        except Exception as error:
+            station.logger.exception("Unhandled error during decay test")
+            return repr(error)
+
+    async def runStationContinuous(self, station, stop: threading.Event, poll_interval: float):
+        """Runs a test whenever a new unit is seated on the station, until stop is set"""
+        while not stop.is_set():
+            try:
+                newUnit = await self.io(station.checkForNewUnit)
+            except Exception:
+                station.logger.exception("Unhandled error while checking for a new unit")
+                newUnit = False
+            if newUnit:
+                error = await self.runStation(station)
+                station.finishUnit(error)
+            else:
+                await station.clock.asleep(poll_interval)
+
+
+def _advance(steps) -> tuple:
+    """Runs steps to its next wait
+    Returns:    (True, returned value) when it finished, (False, seconds to wait) otherwise
+    StopIteration can't be raised through a future, so the end is returned instead"""
+    try:
+        return False, next(steps)
+    except StopIteration as stop:
+        return True, stop.value
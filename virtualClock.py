@@ -0,0 +1,96 @@
+"""Injectable clocks for the decay test loop
+
+Everything in the test loop that reads or waits on time goes through a clock
+object, so a 6 hour TOTALTIME schedule can be run faster than wall time
+against simulated devices.
+    SystemClock         real time, used on the production line
+    AcceleratedClock    wall time scaled by a speedup factor
+    DiscreteEventClock  time only moves when sleep is called, so sleeping is free"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+
+class ClockMode:
+    REAL = "real"
+    ACCELERATED = "accelerated"
+    DISCRETE = "discrete"
+
+
+class SystemClock:
+    """Wall clock time"""
+
+    def time(self) -> float:
+        """Seconds since the epoch, like time.time()"""
+        return time.time()
+
+    def sleep(self, seconds: float):
+        """Blocks for seconds, like time.sleep()"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def asleep(self, seconds: float):
+        """Waits for seconds without blocking the event loop, like asyncio.sleep()"""
+        await asyncio.sleep(max(0.0, seconds))
+
+    def now(self) -> datetime:
+        """Current local datetime, like datetime.now()"""
+        return datetime.fromtimestamp(self.time())
+
+
+class AcceleratedClock(SystemClock):
+    """Wall clock that runs speedup times faster than real time"""
+
+    def __init__(self, speedup: float = 60.0) -> None:
+        if speedup <= 0:
+            raise ValueError(f"Clock speedup must be positive, got {speedup}")
+        self.speedup = speedup
+        self._origin = time.time()
+        self._origin_monotonic = time.monotonic()
+
+    def time(self) -> float:
+        return self._origin + (time.monotonic() - self._origin_monotonic) * self.speedup
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+    async def asleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds) / self.speedup)
+
+
+class DiscreteEventClock(SystemClock):
+    """Virtual clock that jumps forward on sleep instead of blocking
+    Stations share no state, so each station gets its own instance and its
+    events are simply processed in time order as fast as the CPU allows."""
+
+    def __init__(self, start: float = None) -> None:
+        self._now = time.time() if start is None else start
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+
+    async def asleep(self, seconds: float):
+        self.sleep(seconds)
+        # Still yield so other stations' tasks get to run
+        await asyncio.sleep(0)
+
+
+def makeClock(mode: str = ClockMode.REAL, speedup: float = 60.0) -> SystemClock:
+    """Returns a new clock for the given ClockMode
+    Raises:     ValueError on an unknown mode"""
+    if mode == ClockMode.REAL:
+        return SystemClock()
+    if mode == ClockMode.ACCELERATED:
+        return AcceleratedClock(speedup)
+    if mode == ClockMode.DISCRETE:
+        return DiscreteEventClock()
+    raise ValueError(f"Unknown clock mode: {mode}")